@@ -1,18 +1,16 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
+from datetime import date, datetime
 import json
-import os
-from PIL import Image
-import io
-import base64
 from streamlit_option_menu import option_menu
-import streamlit_authenticator as stauth
-import yaml
-from yaml.loader import SafeLoader
+from diary_storage import get_store, get_cache_stats
+from diary_background import RECOVER_RECENT, awaiting_analysis, background_analyzer
+from diary_core import Diary
+from diary_draft import draft_saver
+from diary_reflection import load_reflection, morning_reflection
+from diary_index import EntryOrder, EventIndex, RecordIndex
+from diary_metrics import metrics
+from diary_stats import average_mood, current_streak, rebuild_aggregates
+from diary_analysis import analysis_cache, entry_analysis, parse_date
 
 # Page configuration
 st.set_page_config(
@@ -22,6 +20,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Entries shown per page in the entry browser, and search results shown
+ENTRIES_PER_PAGE = 10
+SEARCH_RESULT_LIMIT = 20
+
 # Custom CSS for better styling
 st.markdown("""
 <style>
@@ -107,7 +109,12 @@ st.markdown("""
 class StudentDiaryApp:
     def __init__(self):
         self.initialize_session_state()
+        self.store = get_store(user_id=st.session_state.user_profile['user_id'])
+        self.store.entry_order = st.session_state.entry_order
+        self.drafts = draft_saver(self.store)
+        self.restore_draft()
         self.load_data()
+        self.merge_analysis()
         
     def initialize_session_state(self):
         """Initialize session state variables"""
@@ -123,6 +130,16 @@ class StudentDiaryApp:
             st.session_state.mood_history = []
         if 'ai_insights' not in st.session_state:
             st.session_state.ai_insights = []
+        if 'aggregates' not in st.session_state:
+            st.session_state.aggregates = rebuild_aggregates([], [])
+        if 'event_index' not in st.session_state:
+            st.session_state.event_index = EventIndex()
+        if 'entry_index' not in st.session_state:
+            st.session_state.entry_index = RecordIndex()
+        if 'entry_order' not in st.session_state:
+            st.session_state.entry_order = EntryOrder()
+        if 'next_ids' not in st.session_state:
+            st.session_state.next_ids = {}
         if 'user_profile' not in st.session_state:
             st.session_state.user_profile = {
                 'name': 'Priya',
@@ -130,22 +147,79 @@ class StudentDiaryApp:
                 'school': 'Delhi Public School',
                 'age': 15
             }
+        if 'user_id' not in st.session_state.user_profile:
+            # Identifies the user's storage shard; renaming doesn't move data
+            st.session_state.user_profile['user_id'] = st.query_params.get(
+                'user', st.session_state.user_profile['name'])
     
     def load_data(self):
         """Load data from local storage or create sample data"""
-        # Load from local files if they exist
-        if os.path.exists('diary_data.json'):
+        with metrics.span('load_data') as span:
+            # Session state already holds the data if storage hasn't changed since
+            try:
+                version = self.store.version()
+            except:
+                version = None
+            if 'data_version' in st.session_state and st.session_state.data_version == version:
+                self.store.data = self.current_data()
+                span.set(entries=len(st.session_state.diary_entries), reloaded=0)
+                return
+            st.session_state.data_version = version
+        
+            # Load from local storage if it exists
+            diary = Diary(self.store, event_index=st.session_state.event_index,
+                          entry_index=st.session_state.entry_index)
             try:
-                with open('diary_data.json', 'r') as f:
-                    data = json.load(f)
-                    st.session_state.diary_entries = data.get('entries', [])
-                    st.session_state.calendar_events = data.get('events', [])
-                    st.session_state.mood_history = data.get('mood_history', [])
-                    st.session_state.ai_insights = data.get('insights', [])
+                loaded = diary.load()
             except:
+                loaded = False
+        
+            if loaded:
+                self.use_diary(diary)
+            else:
                 self.create_sample_data()
-        else:
-            self.create_sample_data()
+                st.session_state.event_index.sync(st.session_state.calendar_events)
+        
+            # Queries fall back to the working copy until something is stored
+            self.store.data = self.current_data()
+            span.set(entries=len(st.session_state.diary_entries), reloaded=1)
+    
+    def restore_draft(self):
+        """Bring back the unsaved entry from the autosaved draft when a session starts"""
+        if 'draft_checked' in st.session_state:
+            return
+        st.session_state.draft_checked = True
+        draft = self.drafts.load()
+        if draft and not st.session_state.current_entry:
+            st.session_state.current_entry = draft['text']
+            st.session_state.current_mood = draft.get('mood')
+            st.toast("📝 Restored your unsaved draft")
+    
+    def merge_analysis(self):
+        """Merge finished background analyses into the diary
+        
+        A new session first re-queues recent entries whose analysis never
+        arrived.
+        """
+        if not background_analyzer.enabled:
+            return
+        if 'pending_analysis' not in st.session_state:
+            st.session_state.pending_analysis = {
+                entry['id']: background_analyzer.submit(entry)
+                for entry in st.session_state.diary_entries[-RECOVER_RECENT:] if awaiting_analysis(entry)}
+        pending = st.session_state.pending_analysis
+        done = [entry_id for entry_id, future in pending.items() if future.done()]
+        if not done:
+            return
+        diary = self.diary()
+        try:
+            for entry_id in done:
+                diary.apply_analysis(entry_id, pending.pop(entry_id).result())
+        except Exception as e:
+            st.error(f"Error saving analysis: {e}")
+        finally:
+            # Reload on the next rerun to pick up writes from other sessions
+            st.session_state.pop('data_version', None)
     
     def create_sample_data(self):
         """Create sample data for demonstration"""
@@ -218,173 +292,70 @@ class StudentDiaryApp:
         st.session_state.diary_entries = sample_entries
         st.session_state.calendar_events = sample_events
         st.session_state.mood_history = sample_mood_history
+        st.session_state.aggregates = self.rebuild_aggregates()
     
-    def save_data(self):
-        """Save data to local storage"""
-        data = {
+    def diary(self):
+        """This session's data as a headless Diary sharing its lists"""
+        return Diary(self.store, self.current_data(), event_index=st.session_state.event_index,
+                     entry_index=st.session_state.entry_index)
+    
+    def use_diary(self, diary):
+        """Make a Diary's collections this session's data"""
+        st.session_state.diary_entries = diary.entries
+        st.session_state.calendar_events = diary.events
+        st.session_state.mood_history = diary.mood_history
+        st.session_state.ai_insights = diary.insights
+        st.session_state.aggregates = diary.aggregates
+        st.session_state.event_index = diary.event_index
+        st.session_state.entry_index = diary.entry_index
+        st.session_state.next_ids = diary.ids.next_ids
+    
+    def current_data(self):
+        """Collect the diary collections from session state"""
+        return {
             'entries': st.session_state.diary_entries,
             'events': st.session_state.calendar_events,
             'mood_history': st.session_state.mood_history,
-            'insights': st.session_state.ai_insights
+            'insights': st.session_state.ai_insights,
+            'aggregates': st.session_state.aggregates,
+            'next_ids': st.session_state.next_ids
         }
+    
+    def save_data(self, changes=None):
+        """Save data to local storage
         
+        When ``changes`` lists the new (collection, record) pairs, backends
+        that support it append just those records instead of rewriting
+        everything.
+        """
         try:
-            with open('diary_data.json', 'w') as f:
-                json.dump(data, f, indent=2)
+            self.diary().save(changes)
+            # Reload on the next rerun to pick up writes from other sessions
+            st.session_state.pop('data_version', None)
         except Exception as e:
             st.error(f"Error saving data: {e}")
     
+    @metrics.timed()
     def analyze_entry(self, entry_text, mood):
-        """Perform basic AI analysis on diary entry"""
-        analysis = {
-            'sentiment': 'neutral',
-            'topics': [],
-            'stress_level': 'low',
-            'insights': []
-        }
-        
-        text_lower = entry_text.lower()
-        
-        # Sentiment analysis
-        positive_words = ['happy', 'excited', 'great', 'amazing', 'wonderful', 'proud', 'success', 'love', 'enjoy', 'fun', 'good', 'nice']
-        negative_words = ['sad', 'angry', 'frustrated', 'worried', 'scared', 'lonely', 'tired', 'stress', 'fail', 'hate', 'bad', 'terrible']
-        
-        positive_count = sum(1 for word in positive_words if word in text_lower)
-        negative_count = sum(1 for word in word in negative_words if word in text_lower)
-        
-        if positive_count > negative_count:
-            analysis['sentiment'] = 'positive'
-        elif negative_count > positive_count:
-            analysis['sentiment'] = 'negative'
-        
-        # Topic detection
-        topics = {
-            'academic': ['test', 'exam', 'homework', 'study', 'class', 'teacher', 'school', 'grade', 'assignment', 'project', 'math', 'physics', 'chemistry'],
-            'social': ['friend', 'group', 'party', 'invite', 'lunch', 'play', 'talk', 'share', 'help', 'support'],
-            'family': ['mom', 'dad', 'parent', 'family', 'home', 'house', 'sister', 'brother'],
-            'cultural': ['diwali', 'holi', 'rakhi', 'ganesh', 'festival', 'celebration', 'tradition', 'culture']
-        }
-        
-        for topic, keywords in topics.items():
-            if any(keyword in text_lower for keyword in keywords):
-                analysis['topics'].append(topic)
-        
-        # Stress level
-        if mood and mood <= 3:
-            analysis['stress_level'] = 'high'
-        elif negative_count > 2:
-            analysis['stress_level'] = 'medium'
-        
-        # Generate insights
-        if analysis['sentiment'] == 'negative':
-            analysis['insights'].append("It's okay to have difficult days. Remember that your feelings are valid and temporary.")
-        
-        if 'academic' in analysis['topics']:
-            analysis['insights'].append("You're showing dedication to your studies. Consider breaking large tasks into smaller steps.")
-        
-        if 'social' in analysis['topics']:
-            analysis['insights'].append("Human connections are important. Remember that you have people who care about you.")
-        
-        if 'cultural' in analysis['topics']:
-            analysis['insights'].append("Your cultural heritage is a beautiful part of who you are. Celebrate it with joy!")
-        
-        return analysis
+        """Perform basic AI analysis on diary entry (memoized)"""
+        return analysis_cache.get(entry_text, mood)
     
     def create_morning_reflection(self, yesterday_entry):
         """Create morning reflection based on yesterday's entry"""
-        if not yesterday_entry:
-            return {
-                'greeting': 'Good morning!',
-                'message': 'A new day begins with endless possibilities.',
-                'encouragement': 'Your thoughts and feelings matter.',
-                'action': 'Today\'s focus: Write about what\'s on your mind.'
-            }
-        
-        analysis = self.analyze_entry(yesterday_entry['content'], yesterday_entry.get('mood'))
-        
-        if analysis['sentiment'] == 'negative':
-            return {
-                'greeting': 'Good morning!',
-                'message': 'Yesterday\'s challenges show your strength in facing difficulties.',
-                'encouragement': 'Remember, every challenge you face makes you stronger.',
-                'action': 'Today\'s focus: Take one step at a time.'
-            }
-        elif analysis['sentiment'] == 'positive':
-            return {
-                'greeting': 'Good morning!',
-                'message': 'Yesterday\'s positive energy is still with you today!',
-                'encouragement': 'Keep that momentum going - you\'re doing great!',
-                'action': 'Today\'s focus: Build on yesterday\'s success.'
-            }
-        else:
-            return {
-                'greeting': 'Good morning!',
-                'message': 'A new day brings new opportunities.',
-                'encouragement': 'You have the power to make today amazing.',
-                'action': 'Today\'s focus: What would make you proud?'
-            }
+        return morning_reflection(yesterday_entry)
+    
+    def todays_reflection(self, latest_entry):
+        """The reflection precomputed this morning, or one made now if it's missing or stale"""
+        return (load_reflection(self.store, date.today(), latest_entry.get('id'))
+                or self.create_morning_reflection(latest_entry))
     
     def detect_calendar_events(self, entry_text):
         """Detect calendar events from diary entry"""
-        events = []
-        text_lower = entry_text.lower()
-        
-        # Date patterns
-        date_patterns = [
-            r'tomorrow',
-            r'next week',
-            r'next month',
-            r'in \d+ days?',
-            r'january \d+',
-            r'february \d+',
-            r'march \d+',
-            r'april \d+',
-            r'may \d+',
-            r'june \d+',
-            r'july \d+',
-            r'august \d+',
-            r'september \d+',
-            r'october \d+',
-            r'november \d+',
-            r'december \d+'
-        ]
-        
-        # Event patterns
-        event_keywords = ['test', 'exam', 'quiz', 'assignment', 'project', 'birthday', 'party', 'celebration', 'festival', 'meeting', 'appointment']
-        
-        # Simple event detection
-        for keyword in event_keywords:
-            if keyword in text_lower:
-                # Find associated date
-                for pattern in date_patterns:
-                    if pattern in text_lower:
-                        event = {
-                            'id': len(st.session_state.calendar_events) + 1,
-                            'title': keyword.title(),
-                            'date': self.parse_date_from_text(text_lower),
-                            'description': f'Detected from diary entry: "{entry_text[:100]}..."',
-                            'type': 'academic' if keyword in ['test', 'exam', 'quiz', 'assignment', 'project'] else 'personal',
-                            'priority': 'high' if keyword in ['test', 'exam', 'quiz'] else 'medium'
-                        }
-                        events.append(event)
-                        break
-        
-        return events
+        return self.diary().detect_events(entry_text)
     
     def parse_date_from_text(self, text):
-        """Parse date from text (simplified)"""
-        # This is a simplified date parser
-        # In a real application, you'd use more sophisticated NLP
-        if 'tomorrow' in text:
-            tomorrow = datetime.now() + timedelta(days=1)
-            return tomorrow.strftime('%Y-%m-%d')
-        elif 'next week' in text:
-            next_week = datetime.now() + timedelta(days=7)
-            return next_week.strftime('%Y-%m-%d')
-        else:
-            # Default to a week from now
-            next_week = datetime.now() + timedelta(days=7)
-            return next_week.strftime('%Y-%m-%d')
+        """Parse the first date expression in text"""
+        return parse_date(text)
     
     def run(self):
         """Main application runner"""
@@ -401,8 +372,8 @@ class StudentDiaryApp:
             st.markdown("### 🧭 Navigation")
             selected = option_menu(
                 menu_title=None,
-                options=["📖 Write Entry", "📊 Insights", "📅 Calendar", "📈 Mood Tracking", "⚙️ Settings"],
-                icons=["pen", "chart", "calendar", "heart", "gear"],
+                options=["📖 Write Entry", "📚 Entries", "📊 Insights", "📅 Calendar", "📈 Mood Tracking", "⚙️ Settings"],
+                icons=["pen", "journal", "chart", "calendar", "heart", "gear"],
                 menu_icon="cast",
                 default_index=0,
             )
@@ -417,13 +388,18 @@ class StudentDiaryApp:
             
             # Quick stats
             st.markdown("### 📊 Quick Stats")
-            st.write(f"**Total Entries:** {len(st.session_state.diary_entries)}")
+            st.write(f"**Total Entries:** {st.session_state.aggregates['total_entries']}")
             st.write(f"**Current Streak:** {self.calculate_streak()} days")
             st.write(f"**Average Mood:** {self.calculate_average_mood():.1f}/10")
+            pending = len(st.session_state.get('pending_analysis', ()))
+            if pending:
+                st.caption(f"⏳ Analyzing {pending} new {'entry' if pending == 1 else 'entries'}…")
         
         # Main content based on selection
         if selected == "📖 Write Entry":
             self.write_entry_page()
+        elif selected == "📚 Entries":
+            self.entries_page()
         elif selected == "📊 Insights":
             self.insights_page()
         elif selected == "📅 Calendar":
@@ -432,7 +408,31 @@ class StudentDiaryApp:
             self.mood_tracking_page()
         elif selected == "⚙️ Settings":
             self.settings_page()
+        
+        # Hidden debug panel: only with metrics on and ?debug=1 in the URL
+        if metrics.enabled and st.query_params.get('debug'):
+            with st.sidebar:
+                self.metrics_panel()
     
+    def metrics_panel(self):
+        """Sidebar table of operation timings"""
+        with st.expander("🛠️ Debug: timings"):
+            summary = metrics.summary()
+            if not summary:
+                st.caption("No spans recorded yet.")
+                return
+            rows = ["| Operation | Runs | p50 | p95 | p99 |", "|---|---|---|---|---|"]
+            for name, row in summary.items():
+                rows.append(f"| {name} | {row['count']} | " + " | ".join(
+                    f"{row[p] * 1000:.1f} ms" for p in ('p50', 'p95', 'p99')) + " |")
+            st.markdown("\n".join(rows))
+            for name, row in summary.items():
+                if row['sizes']:
+                    st.caption(f"{name}: " + ", ".join(f"{size}={value}" for size, value in row['sizes'].items()))
+            st.download_button("📥 Prometheus metrics", metrics.prometheus_text(),
+                               file_name="diary_metrics.prom", mime="text/plain")
+    
+    @metrics.timed()
     def write_entry_page(self):
         """Diary entry writing page"""
         st.markdown("## ✍️ Write Your Diary Entry")
@@ -468,8 +468,9 @@ class StudentDiaryApp:
             placeholder="Today I felt... I learned... I'm grateful for..."
         )
         
-        # Update current entry
+        # Update current entry; the draft autosaves a moment later
         st.session_state.current_entry = entry_text
+        self.drafts.update(entry_text, st.session_state.current_mood)
         
         # Entry actions
         col1, col2, col3 = st.columns([1, 1, 2])
@@ -482,66 +483,132 @@ class StudentDiaryApp:
             if st.button("🗑️ Clear", use_container_width=True):
                 st.session_state.current_entry = ""
                 st.session_state.current_mood = None
+                self.drafts.discard()
                 st.rerun()
         
         # Recent entries
         if st.session_state.diary_entries:
             st.markdown("### 📚 Recent Entries")
-            for entry in st.session_state.diary_entries[-3:]:
+            for entry in self.store.recent_entries(3):
                 with st.expander(f"{entry['date']} - Mood: {entry['mood']}/10"):
                     st.write(entry['content'])
-                    st.caption(f"Topics: {', '.join(entry.get('topics', []))}")
+                    if awaiting_analysis(entry):
+                        st.caption("Topics: analyzing…")
+                    else:
+                        st.caption(f"Topics: {', '.join(entry.get('topics', []))}")
     
+    @metrics.timed()
     def save_entry(self, entry_text):
         """Save diary entry"""
         if not entry_text.strip() and not st.session_state.current_mood:
             st.error("Please write something or select a mood before saving.")
             return
         
-        # Create new entry
-        new_entry = {
-            'id': len(st.session_state.diary_entries) + 1,
-            'date': datetime.now().strftime('%Y-%m-%d'),
-            'content': entry_text.strip(),
-            'mood': st.session_state.current_mood,
-            'topics': [],
-            'word_count': len(entry_text.split()),
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        # Analyze entry
-        analysis = self.analyze_entry(entry_text, st.session_state.current_mood)
-        new_entry['topics'] = analysis['topics']
-        
-        # Add to entries
-        st.session_state.diary_entries.append(new_entry)
-        
-        # Update mood history
-        if st.session_state.current_mood:
-            mood_entry = {
-                'date': datetime.now().strftime('%Y-%m-%d'),
-                'mood': st.session_state.current_mood,
-                'note': entry_text[:50] + "..." if len(entry_text) > 50 else entry_text
-            }
-            st.session_state.mood_history.append(mood_entry)
-        
-        # Detect calendar events
-        events = self.detect_calendar_events(entry_text)
-        for event in events:
-            if not any(existing['title'] == event['title'] and existing['date'] == event['date'] 
-                      for existing in st.session_state.calendar_events):
-                st.session_state.calendar_events.append(event)
+        # Add the analyzed entry, its mood record and any events it mentions;
+        # in the background mode the raw entry is saved and analyzed later
+        background = background_analyzer.enabled
+        diary = self.diary()
+        new_entry, changes = diary.add_entry(entry_text, st.session_state.current_mood, analyze=not background)
+        st.session_state.aggregates = diary.aggregates
         
-        # Save data
-        self.save_data()
+        # Save data (which may renumber the entry if another tab took its id)
+        self.save_data(changes)
+        if 'search_index' in st.session_state:
+            st.session_state.search_index.add(new_entry)
+        if background:
+            st.session_state.pending_analysis[new_entry['id']] = background_analyzer.submit(new_entry)
         
         # Clear current entry
         st.session_state.current_entry = ""
         st.session_state.current_mood = None
+        self.drafts.discard()
         
         st.success("Entry saved successfully! Your AI reflection will be ready tomorrow morning.")
         st.rerun()
     
+    @metrics.timed()
+    def entries_page(self):
+        """Browse past entries one page at a time"""
+        st.markdown("## 📚 Your Entries")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            start = st.date_input("From", value=None, key='browse_start')
+        with col2:
+            end = st.date_input("To", value=None, key='browse_end')
+        
+        query = st.text_input("🔍 Search your entries", key='browse_query',
+                              placeholder='e.g. chemistry priya, or "math test" for an exact phrase')
+        if query.strip():
+            self.show_search_results(query, start, end)
+            return
+        
+        # A new filter starts again from the first page
+        date_filter = (start, end)
+        if st.session_state.get('browse_filter') != date_filter:
+            st.session_state.browse_filter = date_filter
+            st.session_state.browse_page = 0
+        page = st.session_state.get('browse_page', 0)
+        
+        # Only this page's summaries are loaded; text is fetched when asked for
+        summaries, total = self.store.entries_page(
+            page, ENTRIES_PER_PAGE,
+            start=start.isoformat() if start else None,
+            end=end.isoformat() if end else None)
+        if not total:
+            st.info("No entries found for these dates.")
+            return
+        
+        page_count = (total + ENTRIES_PER_PAGE - 1) // ENTRIES_PER_PAGE
+        st.caption(f"{total} entries · page {page + 1} of {page_count}")
+        
+        opened = st.session_state.setdefault('opened_entries', set())
+        for summary in summaries:
+            with st.expander(f"{summary['date']} - Mood: {summary['mood']}/10"):
+                if summary['id'] in opened:
+                    st.write(self.store.get_entry_content(summary['id']))
+                else:
+                    st.button("📖 Read entry", key=f"read_entry_{summary['id']}",
+                              on_click=opened.add, args=(summary['id'],))
+                st.caption(f"Topics: {', '.join(summary.get('topics') or [])} · "
+                           f"{summary.get('word_count') or 0} words")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.button("⬅️ Newer", disabled=page == 0,
+                      on_click=self.set_browse_page, args=(page - 1,))
+        with col2:
+            st.button("Older ➡️", disabled=page + 1 >= page_count,
+                      on_click=self.set_browse_page, args=(page + 1,))
+    
+    def show_search_results(self, query, start, end):
+        """Show entries matching a search query, best match first"""
+        min_mood, max_mood = st.slider("Mood", 1, 10, (1, 10), key='browse_mood')
+        results = self.search_index().search(
+            query, limit=SEARCH_RESULT_LIMIT,
+            start=start.isoformat() if start else None,
+            end=end.isoformat() if end else None,
+            min_mood=min_mood if min_mood > 1 else None,
+            max_mood=max_mood if max_mood < 10 else None)
+        if not results:
+            st.info("No entries match your search.")
+            return
+        
+        st.caption(f"Top {len(results)} matches")
+        opened = st.session_state.setdefault('opened_entries', set())
+        for result in results:
+            with st.expander(f"{result['date']} - Mood: {result['mood']}/10"):
+                if result['id'] in opened:
+                    st.write(self.store.get_entry_content(result['id']))
+                else:
+                    st.button("📖 Read entry", key=f"read_result_{result['id']}",
+                              on_click=opened.add, args=(result['id'],))
+    
+    def set_browse_page(self, page):
+        """Move the entry browser to another page"""
+        st.session_state.browse_page = page
+    
+    @metrics.timed()
     def insights_page(self):
         """AI insights and analysis page"""
         st.markdown("## 🧠 AI Insights & Analysis")
@@ -552,7 +619,7 @@ class StudentDiaryApp:
         
         # Latest entry analysis
         latest_entry = st.session_state.diary_entries[-1]
-        analysis = self.analyze_entry(latest_entry['content'], latest_entry.get('mood'))
+        analysis = entry_analysis(latest_entry)
         
         # Display analysis
         col1, col2 = st.columns(2)
@@ -587,7 +654,7 @@ class StudentDiaryApp:
         # Morning reflection
         if st.session_state.diary_entries:
             st.markdown("### 🌅 Morning Reflection")
-            reflection = self.create_morning_reflection(latest_entry)
+            reflection = self.todays_reflection(latest_entry)
             
             st.markdown(f"""
             <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
@@ -599,6 +666,7 @@ class StudentDiaryApp:
             </div>
             """, unsafe_allow_html=True)
     
+    @metrics.timed()
     def calendar_page(self):
         """Calendar and events page"""
         st.markdown("## 📅 Calendar & Events")
@@ -616,16 +684,14 @@ class StudentDiaryApp:
             
             if st.button("Add Event"):
                 if event_title and event_date:
-                    new_event = {
-                        'id': len(st.session_state.calendar_events) + 1,
+                    new_event = self.diary().add_event({
                         'title': event_title,
                         'date': event_date.strftime('%Y-%m-%d'),
                         'description': f'Manually added event',
                         'type': event_type,
                         'priority': 'medium'
-                    }
-                    st.session_state.calendar_events.append(new_event)
-                    self.save_data()
+                    })
+                    self.save_data([('events', new_event)])
                     st.success("Event added successfully!")
                     st.rerun()
         
@@ -633,23 +699,9 @@ class StudentDiaryApp:
         if st.session_state.calendar_events:
             st.markdown("### 📋 Upcoming Events")
             
-            # Sort events by date
-            sorted_events = sorted(st.session_state.calendar_events, key=lambda x: x['date'])
-            
-            # Filter upcoming events (next 30 days)
-            today = datetime.now().date()
-            upcoming_events = []
-            
-            for event in sorted_events:
-                event_date = datetime.strptime(event['date'], '%Y-%m-%d').date()
-                if event_date >= today:
-                    days_until = (event_date - today).days
-                    event['days_until'] = days_until
-                    upcoming_events.append(event)
-            
             # Display events
-            for event in upcoming_events[:10]:  # Show next 10 events
-                days_text = "Today" if event['days_until'] == 0 else f"In {event['days_until']} days"
+            for event, days_until in self.upcoming_calendar_events():
+                days_text = "Today" if days_until == 0 else f"In {days_until} days"
                 
                 st.markdown(f"""
                 <div class="calendar-event">
@@ -663,6 +715,11 @@ class StudentDiaryApp:
         else:
             st.info("No events scheduled. Add some events to get started!")
     
+    def upcoming_calendar_events(self, today=None):
+        """Next 10 events in the coming 30 days, with days until each"""
+        return self.diary().upcoming_events(today or datetime.now().date(), limit=10, days=30)
+    
+    @metrics.timed()
     def mood_tracking_page(self):
         """Mood tracking and visualization page"""
         st.markdown("## 📈 Mood Tracking & Trends")
@@ -674,62 +731,94 @@ class StudentDiaryApp:
         # Mood chart
         st.markdown("### 📊 Mood Over Time")
         
-        # Prepare data for plotting
-        mood_df = pd.DataFrame(st.session_state.mood_history)
-        mood_df['date'] = pd.to_datetime(mood_df['date'])
-        mood_df = mood_df.sort_values('date')
-        
-        # Create mood chart
-        fig = px.line(
-            mood_df, 
-            x='date', 
-            y='mood',
-            title='Your Mood Journey',
-            labels={'mood': 'Mood Rating (1-10)', 'date': 'Date'},
-            markers=True
-        )
-        
-        fig.update_layout(
-            yaxis=dict(range=[0, 10]),
-            yaxis_tickvals=list(range(1, 11)),
-            height=400
-        )
+        # Mood history is kept as date-ordered arrays, ready to plot
+        from diary_mood import CHART_MODES
+        mood_series = self.mood_series()
         
-        st.plotly_chart(fig, use_container_width=True)
+        chart_mode = st.radio("Chart", list(CHART_MODES), horizontal=True, key='mood_chart_mode')
+        st.plotly_chart(self.mood_figure(chart_mode), use_container_width=True)
         
         # Mood statistics
+        stats = mood_series.stats()
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            avg_mood = mood_df['mood'].mean()
-            st.metric("Average Mood", f"{avg_mood:.1f}/10")
+            st.metric("Average Mood", f"{stats['mean']:.1f}/10")
         
         with col2:
-            best_mood = mood_df['mood'].max()
-            st.metric("Best Mood", f"{best_mood}/10")
+            st.metric("Best Mood", f"{stats['max']}/10")
         
         with col3:
-            worst_mood = mood_df['mood'].min()
-            st.metric("Lowest Mood", f"{worst_mood}/10")
+            st.metric("Lowest Mood", f"{stats['min']}/10")
         
         with col4:
-            mood_count = len(mood_df)
-            st.metric("Days Tracked", mood_count)
+            st.metric("Days Tracked", stats['count'])
         
         # Recent mood entries
         st.markdown("### 📝 Recent Mood Entries")
-        recent_moods = mood_df.tail(7)  # Last 7 entries
         
-        for _, mood_entry in recent_moods.iterrows():
-            mood_emoji = "😢" if mood_entry['mood'] <= 3 else "😔" if mood_entry['mood'] <= 5 else "😐" if mood_entry['mood'] <= 7 else "😊"
+        for mood_date, mood, note in mood_series.tail(7):  # Last 7 entries
+            mood_emoji = "😢" if mood <= 3 else "😔" if mood <= 5 else "😐" if mood <= 7 else "😊"
             
             st.markdown(f"""
             <div style="background: white; padding: 1rem; border-radius: 8px; margin: 0.5rem 0; border-left: 4px solid #667eea;">
-                <p><strong>{mood_entry['date'].strftime('%B %d, %Y')}</strong> {mood_emoji} <strong>Mood: {mood_entry['mood']}/10</strong></p>
-                <p><em>{mood_entry['note']}</em></p>
+                <p><strong>{mood_date.strftime('%B %d, %Y')}</strong> {mood_emoji} <strong>Mood: {mood}/10</strong></p>
+                <p><em>{note}</em></p>
             </div>
             """, unsafe_allow_html=True)
     
+    def mood_series(self):
+        """Columnar mood history, created the first time a page needs it"""
+        from diary_mood import MoodSeries
+        if 'mood_series' not in st.session_state:
+            st.session_state.mood_series = MoodSeries()
+        return st.session_state.mood_series.sync(st.session_state.mood_history)
+    
+    def search_index(self):
+        """Full-text search index, opened the first time a search runs"""
+        from diary_search import SearchIndex, search_index_path
+        if 'search_index' not in st.session_state:
+            st.session_state.search_index = SearchIndex.open(search_index_path(self.store))
+        return st.session_state.search_index.sync(st.session_state.diary_entries)
+    
+    def mood_figure(self, chart_mode):
+        """Build the mood chart, reusing it until the mood data changes"""
+        import plotly.graph_objects as go
+        from diary_mood import CHART_MODES
+        
+        mood_series = self.mood_series()
+        cache = st.session_state.setdefault('mood_figures', {})
+        if cache.get('version') != mood_series.version:
+            cache.clear()
+            cache['version'] = mood_series.version
+        if chart_mode in cache:
+            return cache[chart_mode]
+        
+        points = mood_series.chart_data(CHART_MODES[chart_mode])
+        fig = go.Figure()
+        if points['low'] is not None:
+            # Min/max band behind the bucket means
+            fig.add_trace(go.Scatter(x=points['x'], y=points['high'], mode='lines',
+                                     line=dict(width=0), hoverinfo='skip', showlegend=False))
+            fig.add_trace(go.Scatter(x=points['x'], y=points['low'], mode='lines', fill='tonexty',
+                                     fillcolor='rgba(102, 126, 234, 0.2)', line=dict(width=0),
+                                     name='Min-max range'))
+        fig.add_trace(go.Scatter(x=points['x'], y=points['y'], mode='lines+markers',
+                                 line=dict(color='#667eea'), name='Mood'))
+        
+        fig.update_layout(
+            title='Your Mood Journey',
+            xaxis_title='Date',
+            yaxis_title='Mood Rating (1-10)',
+            yaxis=dict(range=[0, 10]),
+            yaxis_tickvals=list(range(1, 11)),
+            showlegend=False,
+            height=400
+        )
+        cache[chart_mode] = fig
+        return fig
+    
+    @metrics.timed()
     def settings_page(self):
         """Settings and configuration page"""
         st.markdown("## ⚙️ Settings & Configuration")
@@ -758,6 +847,8 @@ class StudentDiaryApp:
         
         # Data management
         st.markdown("### 💾 Data Management")
+        cache_stats = get_cache_stats()
+        st.caption(f"Data cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
         
         col1, col2 = st.columns(2)
         
@@ -773,46 +864,27 @@ class StudentDiaryApp:
         # Export data as JSON
         if st.button("📄 Download Data Backup"):
             self.download_data_backup()
+        
+        # Restore entries from a JSON export or NDJSON backup
+        uploaded = st.file_uploader("📤 Import a backup", type=['json', 'ndjson', 'gz'])
+        if uploaded is not None and st.button("📤 Import Backup"):
+            self.import_backup(uploaded)
     
     def calculate_streak(self):
         """Calculate current writing streak"""
-        if not st.session_state.diary_entries:
-            return 0
-        
-        # Sort entries by date
-        sorted_entries = sorted(st.session_state.diary_entries, key=lambda x: x['date'])
-        
-        streak = 0
-        current_date = datetime.now().date()
-        
-        for entry in reversed(sorted_entries):
-            entry_date = datetime.strptime(entry['date'], '%Y-%m-%d').date()
-            days_diff = (current_date - entry_date).days
-            
-            if days_diff == streak:
-                streak += 1
-            else:
-                break
-        
-        return streak
+        return current_streak(st.session_state.aggregates)
     
     def calculate_average_mood(self):
         """Calculate average mood from recent entries"""
-        if not st.session_state.mood_history:
-            return 0
-        
-        recent_moods = [entry['mood'] for entry in st.session_state.mood_history[-7:]]  # Last 7 days
-        return sum(recent_moods) / len(recent_moods) if recent_moods else 0
+        return average_mood(st.session_state.aggregates)
+    
+    def rebuild_aggregates(self):
+        """Recompute quick stats from the full history"""
+        return rebuild_aggregates(st.session_state.diary_entries, st.session_state.mood_history)
     
     def export_data(self):
         """Export data to JSON file"""
-        data = {
-            'user_profile': st.session_state.user_profile,
-            'diary_entries': st.session_state.diary_entries,
-            'calendar_events': st.session_state.calendar_events,
-            'mood_history': st.session_state.mood_history,
-            'export_date': datetime.now().isoformat()
-        }
+        data = self.diary().export_data(st.session_state.user_profile)
         
         # Convert to JSON string
         json_str = json.dumps(data, indent=2, default=str)
@@ -825,27 +897,78 @@ class StudentDiaryApp:
             mime="application/json"
         )
     
+    def import_backup(self, uploaded):
+        """Merge an uploaded backup into the diary, skipping what's already there"""
+        import os
+        import shutil
+        import tempfile
+        from diary_import import import_backup
+        
+        # The importer streams from disk, so spool the upload to a file first
+        with tempfile.NamedTemporaryFile(suffix='.backup', delete=False) as f:
+            shutil.copyfileobj(uploaded, f)
+            path = f.name
+        progress_bar = st.progress(0.0, text="Importing backup...")
+        
+        def progress(read, total):
+            fraction = min(read / total, 1.0) if total else 0.0
+            progress_bar.progress(fraction, text=f"Imported {read} records...")
+        
+        diary = self.diary()
+        try:
+            stats = import_backup(diary, path, progress=progress)
+        except Exception as e:
+            st.error(f"Error importing backup: {e}")
+            return
+        finally:
+            os.remove(path)
+            self.use_diary(diary)
+            st.session_state.pop('data_version', None)
+        
+        progress_bar.progress(1.0, text="Import complete")
+        added = stats['added']
+        st.success(f"Imported {added['entries']} entries, {added['events']} events and "
+                   f"{added['mood_history']} mood records "
+                   f"({stats['duplicates']} duplicates skipped, {stats['invalid']} invalid).")
+        for error in stats['errors'][:5]:
+            st.warning(error)
+    
     def clear_all_data(self):
         """Clear all application data"""
-        st.session_state.diary_entries = []
-        st.session_state.calendar_events = []
-        st.session_state.mood_history = []
-        st.session_state.ai_insights = []
+        # Empties the collections and removes stored data
+        diary = self.diary()
+        diary.clear()
+        self.use_diary(diary)
+        st.session_state.pop('mood_series', None)
+        self.search_index().clear()
         st.session_state.current_entry = ""
         st.session_state.current_mood = None
-        
-        # Remove data file
-        if os.path.exists('diary_data.json'):
-            os.remove('diary_data.json')
+        self.drafts.discard()
+        st.session_state.pop('data_version', None)
         
         st.success("All data cleared successfully!")
         st.rerun()
     
     def download_data_backup(self):
-        """Download data backup"""
-        self.export_data()
+        """Download a compressed NDJSON backup, streamed chunk by chunk"""
+        import io
+        from diary_export import write_backup_to
+        
+        # Only the compressed bytes are held, never the whole diary as one string
+        backup = io.BytesIO()
+        write_backup_to(backup, self.current_data(), st.session_state.user_profile, compress=True)
+        st.download_button(
+            label="📥 Download Backup",
+            data=backup,
+            file_name=f"diary_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson.gz",
+            mime="application/gzip"
+        )
 
 # Main application
 if __name__ == "__main__":
-    app = StudentDiaryApp()
-    app.run()
+    try:
+        with metrics.span('rerun'):
+            app = StudentDiaryApp()
+            app.run()
+    finally:
+        metrics.flush()
@@ -0,0 +1,573 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for AI Student Diary application
+Measures the hot paths of the app without running Streamlit
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from datetime import date, datetime, timedelta
+
+from diary_analysis import analyze_text, extract_events, POSITIVE_WORDS, NEGATIVE_WORDS, TOPIC_KEYWORDS
+
+KEYWORDS = POSITIVE_WORDS + NEGATIVE_WORDS + [k for words in TOPIC_KEYWORDS.values() for k in words]
+# Look-alikes that substring matching used to count as keywords
+LOOKALIKE_WORDS = ['classic', 'funeral', 'homeworks', 'badminton', 'sadly', 'partly', 'grandmother']
+
+
+def make_vocabulary(size=3000, seed=0):
+    """Build a deterministic vocabulary of made-up filler words"""
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(2, 9))) for _ in range(size)]
+
+
+def make_entry(word_count, seed=0, keyword_density=0.02, vocabulary=None):
+    """Build a deterministic synthetic diary entry of ``word_count`` words"""
+    rng = random.Random(seed)
+    vocabulary = vocabulary or make_vocabulary(seed=seed) + LOOKALIKE_WORDS
+    words = []
+    for _ in range(word_count):
+        if rng.random() < keyword_density:
+            words.append(rng.choice(KEYWORDS))
+        else:
+            words.append(rng.choice(vocabulary) + rng.choice(['', '', '', ',', '.']))
+    return ' '.join(words).capitalize() + '.'
+
+
+def legacy_analyze(entry_text, mood):
+    """The original analyze_entry: one substring scan per keyword"""
+    text_lower = entry_text.lower()
+    positive_words = ['happy', 'excited', 'great', 'amazing', 'wonderful', 'proud', 'success', 'love', 'enjoy', 'fun', 'good', 'nice']
+    negative_words = ['sad', 'angry', 'frustrated', 'worried', 'scared', 'lonely', 'tired', 'stress', 'fail', 'hate', 'bad', 'terrible']
+    positive_count = sum(1 for word in positive_words if word in text_lower)
+    negative_count = sum(1 for word in negative_words if word in text_lower)
+    topics = {
+        'academic': ['test', 'exam', 'homework', 'study', 'class', 'teacher', 'school', 'grade', 'assignment', 'project', 'math', 'physics', 'chemistry'],
+        'social': ['friend', 'group', 'party', 'invite', 'lunch', 'play', 'talk', 'share', 'help', 'support'],
+        'family': ['mom', 'dad', 'parent', 'family', 'home', 'house', 'sister', 'brother'],
+        'cultural': ['diwali', 'holi', 'rakhi', 'ganesh', 'festival', 'celebration', 'tradition', 'culture']
+    }
+    found = [topic for topic, keywords in topics.items() if any(k in text_lower for k in keywords)]
+    return positive_count, negative_count, found
+
+
+def time_per_call(func, *args, repeat=5, number=20):
+    """Return the best per-call time in seconds over ``repeat`` rounds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func(*args)
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def bench_analyze_entry():
+    """Per-entry latency of the single-pass matcher against the legacy scans"""
+    print("⏱️  analyze_entry per-entry latency")
+    print(f"{'words':>8} {'keywords':>9} {'legacy (µs)':>14} {'single-pass (µs)':>17}")
+    for keyword_density in (0.02, 0.1):
+        for word_count in (50, 500, 5000, 20000):
+            entry = make_entry(word_count, seed=word_count, keyword_density=keyword_density)
+            legacy = time_per_call(legacy_analyze, entry, 6)
+            single_pass = time_per_call(analyze_text, entry, 6)
+            print(f"{word_count:>8} {keyword_density:>9.0%} {legacy * 1e6:>14.1f} {single_pass * 1e6:>17.1f}")
+
+
+def legacy_detect_events(entry_text):
+    """The original detect_calendar_events: keyword x pattern substring checks"""
+    date_patterns = [r'tomorrow', r'next week', r'in \d+ days?', r'on \w+day', r'\d{1,2}/\d{1,2}',
+                     r'(january|february|march|april|may|june|july|august|september|october|november|december) \d{1,2}']
+    event_keywords = ['test', 'exam', 'quiz', 'assignment', 'project', 'birthday', 'party', 'celebration', 'festival', 'meeting', 'appointment']
+    text_lower = entry_text.lower()
+    events = []
+    for keyword in event_keywords:
+        if keyword in text_lower:
+            for pattern in date_patterns:
+                if pattern in text_lower:
+                    events.append(keyword)
+                    break
+    return events
+
+
+def make_event_corpus(count, today, seed=0):
+    """Build entries that each mention one event with a known date.
+
+    Returns a list of (entry text, expected title, expected date).
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(seed=seed)
+    month_names = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+                   'August', 'September', 'October', 'November', 'December']
+    weekdays = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+    corpus = []
+    for _ in range(count):
+        subject, keyword = rng.choice(['Math', 'Physics', 'History']), rng.choice(['test', 'exam', 'quiz'])
+        offset = rng.randint(1, 60)
+        when = today + timedelta(days=offset)
+        phrase = rng.choice([
+            f"on {month_names[when.month - 1]} {when.day}",
+            f"on {when.day}th of {month_names[when.month - 1][:3]}",
+            f"in {offset} days",
+            f"on {when.isoformat()}",
+            f"on {weekdays[when.weekday()]}" if offset <= 7 else f"in {offset} days",
+        ])
+        filler = ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(20, 120)))
+        corpus.append((f"{filler}. I have a {subject.lower()} {keyword} {phrase}. {filler}.",
+                       f"{subject} {keyword.title()}", when))
+    return corpus
+
+
+def bench_detect_events(count=5000):
+    """Throughput and date accuracy of event extraction over a synthetic corpus"""
+    today = date(2025, 1, 15)
+    corpus = make_event_corpus(count, today)
+    texts = [text for text, _, _ in corpus]
+
+    print(f"⏱️  detect_calendar_events over {count} synthetic entries")
+    legacy = time_per_call(lambda: [legacy_detect_events(text) for text in texts], repeat=3, number=1)
+    engine = time_per_call(lambda: [extract_events(text, today) for text in texts], repeat=3, number=1)
+    legacy_found = sum(1 for text in texts if legacy_detect_events(text))
+    correct = sum(1 for text, title, when in corpus if extract_events(text, today) == [(title.split()[-1].lower(), title, when)])
+    print(f"{'':>12} {'entries/s':>12} {'correct dates':>14}")
+    print(f"{'legacy':>12} {count / legacy:>12.0f} {'n/a':>14}  (matched {legacy_found}/{count} entries, no dates)")
+    print(f"{'extraction':>12} {count / engine:>12.0f} {correct / count:>14.1%}")
+
+
+def make_mood_history(days, per_day=1, seed=0):
+    """Build ``days`` of synthetic mood records, ``per_day`` per day"""
+    rng = random.Random(seed)
+    start = date(2020, 1, 1)
+    return [{'date': (start + timedelta(days=day)).isoformat(), 'mood': rng.randint(1, 10), 'note': 'Daily check-in'}
+            for day in range(days) for _ in range(per_day)]
+
+
+def legacy_mood_stats(mood_history):
+    """The original mood page: DataFrame, to_datetime, sort and iterrows on every render"""
+    import pandas as pd
+    mood_df = pd.DataFrame(mood_history)
+    mood_df['date'] = pd.to_datetime(mood_df['date'])
+    mood_df = mood_df.sort_values('date')
+    stats = (mood_df['mood'].mean(), mood_df['mood'].max(), mood_df['mood'].min(), len(mood_df))
+    recent = [(row['date'], row['mood'], row['note']) for _, row in mood_df.tail(7).iterrows()]
+    return stats, recent
+
+
+def bench_mood_page(years=(1, 5)):
+    """Per-render cost and memory of mood statistics, DataFrame vs MoodSeries"""
+    import sys
+    from diary_mood import MoodSeries
+
+    print("⏱️  mood page statistics per render")
+    print(f"{'records':>8} {'DataFrame (ms)':>15} {'MoodSeries (ms)':>16} {'dicts (KB)':>11} {'columns (KB)':>13}")
+    for count in years:
+        history = make_mood_history(365 * count, per_day=2)
+        series = MoodSeries(history)
+        legacy = time_per_call(legacy_mood_stats, history, repeat=3, number=3)
+        columnar = time_per_call(lambda: (series.stats(), series.tail(7)), repeat=3, number=20)
+        dict_bytes = sum(sys.getsizeof(record) for record in history)
+        print(f"{len(history):>8} {legacy * 1e3:>15.2f} {columnar * 1e3:>16.3f} "
+              f"{dict_bytes / 1024:>11.0f} {series.nbytes / 1024:>13.0f}")
+
+
+def bench_mood_chart(years=(1, 5, 10), per_day=3):
+    """Points sent to the browser and build time of the mood chart data"""
+    from diary_mood import CHART_MODES, MoodSeries
+
+    print("⏱️  mood chart points and build time")
+    print(f"{'records':>8} " + ' '.join(f"{mode:>18}" for mode in CHART_MODES))
+    for count in years:
+        series = MoodSeries(make_mood_history(365 * count, per_day=per_day))
+        cells = []
+        for frequency in CHART_MODES.values():
+            points = series.chart_data(frequency)
+            seconds = time_per_call(series.chart_data, frequency, repeat=3, number=3)
+            cells.append(f"{len(points['x']):>6} pts {seconds * 1e3:>6.1f} ms")
+        print(f"{len(series):>8} " + ' '.join(f"{cell:>18}" for cell in cells))
+
+
+def bench_entry_pages(sizes=(1000, 10000, 50000)):
+    """Time to fetch one page of the entry browser as the diary grows"""
+    import os
+    import tempfile
+    from diary_storage import JsonStore, SqliteStore, empty_data
+
+    print("⏱️  entry browser page fetch")
+    print(f"{'entries':>8} {'json (ms)':>10} {'sqlite (ms)':>12} {'sqlite filtered (ms)':>21}")
+    start = date(2015, 1, 1)
+    vocabulary = make_vocabulary()
+    contents = [make_entry(200, seed=seed, vocabulary=vocabulary) for seed in range(50)]
+    for size in sizes:
+        data = empty_data()
+        data['entries'] = [{'id': i, 'date': (start + timedelta(days=i // 3)).isoformat(),
+                            'content': contents[i % 50], 'mood': 5, 'topics': [], 'word_count': 200}
+                           for i in range(1, size + 1)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_store = JsonStore(os.path.join(tmp_dir, 'diary.json'))
+            json_store.data = data
+            sqlite_store = SqliteStore(os.path.join(tmp_dir, 'diary.db'), legacy_path=None)
+            sqlite_store.save(data)
+            json_store.entries_page(0)
+            json_ms = time_per_call(json_store.entries_page, 5, repeat=3, number=10) * 1e3
+            sqlite_ms = time_per_call(sqlite_store.entries_page, 5, repeat=3, number=10) * 1e3
+            filtered_ms = time_per_call(sqlite_store.entries_page, 0, 10, '2016-01-01', '2016-03-31',
+                                        repeat=3, number=10) * 1e3
+            sqlite_store.close()
+        print(f"{size:>8} {json_ms:>10.3f} {sqlite_ms:>12.3f} {filtered_ms:>21.3f}")
+
+
+def bench_search(count=100000, words_per_entry=120):
+    """Index build rate and query latency of full-text search"""
+    from diary_search import SearchIndex
+
+    rng = random.Random(0)
+    vocabulary = make_vocabulary(20000)
+    keywords = KEYWORDS + ['priya', 'aarav', 'cricket']
+    index = SearchIndex()
+    start = time.perf_counter()
+    for i in range(count):
+        content = ' '.join(rng.choice(keywords) if rng.random() < 0.05 else rng.choice(vocabulary)
+                           for _ in range(words_per_entry))
+        index.add({'id': i + 1, 'date': (date(2015, 1, 1) + timedelta(days=i // 20)).isoformat(),
+                   'mood': rng.randint(1, 10), 'content': content}, persist=False)
+    build = time.perf_counter() - start
+
+    print(f"⏱️  search over {count} entries (indexed at {count / build:.0f} entries/s)")
+    for query, filters in [('happy', {}), ('chemistry with priya', {}), ('"chemistry priya"', {}),
+                           ('test exam homework', {}), ('stress', {'start': '2018-01-01', 'min_mood': 6})]:
+        seconds = time_per_call(lambda: index.search(query, **filters), repeat=3, number=5)
+        print(f"{query + (' (filtered)' if filters else ''):>32} {seconds * 1e3:>8.2f} ms")
+
+
+
+def bench_export(count=100000):
+    """Peak memory and time of the JSON export against the streamed backup"""
+    import tracemalloc
+    from benchmark_suite import make_diary
+    from diary_export import write_backup
+
+    data = make_diary(count)
+
+    def legacy_export():
+        backup = {'diary_entries': data['entries'], 'calendar_events': data['events'],
+                  'mood_history': data['mood_history'], 'export_date': datetime.now().isoformat()}
+        return json.dumps(backup, indent=2, default=str).encode()
+
+    print(f"⏱️  export of {count} entries")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, export in [('json indent=2', legacy_export),
+                             ('ndjson', lambda: write_backup(os.path.join(tmp_dir, 'b.ndjson'), data)),
+                             ('ndjson.gz', lambda: write_backup(os.path.join(tmp_dir, 'b.ndjson.gz'), data))]:
+            start = time.perf_counter()
+            result = export()
+            seconds = time.perf_counter() - start
+            # Measured on a second run: tracing slows the export down
+            tracemalloc.start()
+            export()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            size = len(result) if isinstance(result, bytes) else result
+            print(f"{name:>16} {seconds:>7.2f} s  peak {peak / 2**20:>7.1f} MiB  output {size / 2**20:>7.1f} MiB")
+
+
+
+def write_import_files(directory, count, seed=0):
+    """Write a ``count``-record backup as NDJSON and as an export JSON document"""
+    from diary_export import EXPORT_SCHEMA_VERSION
+
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary()
+    contents = [' '.join(rng.choice(vocabulary) for _ in range(60)) for _ in range(256)]
+    start = date(2015, 1, 1)
+    counts = {'entries': count * 80 // 100, 'events': count // 100, 'mood_history': 0, 'insights': 0}
+    counts['mood_history'] = count - counts['entries'] - counts['events']
+
+    def records():
+        for i in range(counts['entries']):
+            yield 'entries', {'id': i + 1, 'date': (start + timedelta(days=i // 3)).isoformat(),
+                              'content': f"{i} {contents[i % 256]}", 'mood': rng.randint(1, 10),
+                              'topics': ['academic'], 'word_count': 61}
+        for i in range(counts['events']):
+            yield 'events', {'id': i + 1, 'title': f"Event {i}", 'date': (start + timedelta(days=i)).isoformat(),
+                             'description': '', 'type': 'academic', 'priority': 'medium'}
+        for i in range(counts['mood_history']):
+            yield 'mood_history', {'date': (start + timedelta(days=i // 3)).isoformat(),
+                                   'mood': rng.randint(1, 10), 'note': f"note {i}"}
+
+    ndjson_path = os.path.join(directory, 'import.ndjson')
+    with open(ndjson_path, 'w') as f:
+        f.write(json.dumps({'type': 'header', 'schema_version': EXPORT_SCHEMA_VERSION, 'counts': counts}) + '\n')
+        for collection, record in records():
+            f.write(json.dumps({'type': collection, 'record': record}) + '\n')
+
+    keys = {'entries': 'diary_entries', 'events': 'calendar_events', 'mood_history': 'mood_history'}
+    json_path = os.path.join(directory, 'import.json')
+    with open(json_path, 'w') as f:
+        f.write('{\n  "user_profile": {"name": "Priya"}')
+        current = None
+        for collection, record in records():
+            if collection != current:
+                f.write(('\n  ]' if current else '') + f',\n  "{keys[collection]}": [\n    ')
+                current = collection
+            else:
+                f.write(',\n    ')
+            f.write(json.dumps(record))
+        f.write('\n  ]\n}\n')
+    return ndjson_path, json_path
+
+
+def bench_import(count=1000000):
+    """Throughput of streaming a backup into each storage backend"""
+    from diary_core import Diary
+    from diary_import import import_backup
+    from diary_storage import get_store
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ndjson_path, json_path = write_import_files(tmp_dir, count)
+        print(f"⏱️  import of {count} records")
+        for name, path, backend in [('ndjson -> journal', ndjson_path, 'journal'),
+                                    ('ndjson -> sqlite', ndjson_path, 'sqlite'),
+                                    ('json -> json', json_path, 'json'),
+                                    ('json -> sqlite', json_path, 'sqlite')]:
+            diary = Diary(get_store(backend, user_id=name, data_dir=tmp_dir))
+            start = time.perf_counter()
+            stats = import_backup(diary, path)
+            seconds = time.perf_counter() - start
+            added = sum(stats['added'].values())
+            print(f"{name:>20} {seconds:>7.2f} s  {stats['read'] / seconds:>9.0f} records/s  ({added} added)")
+
+
+DIARY_SENTENCES = [
+    "Today I {verb} {thing} with {person}.", "I felt {feeling} after {thing}.",
+    "Tomorrow I have {thing} in the morning.", "It was a {feeling} day overall.",
+    "I spent most of the afternoon on {thing}.", "{person} and I talked about {thing} for hours.",
+    "I really need to start {thing} earlier next week.", "Honestly I am a bit {feeling} about {thing}.",
+]
+DIARY_FILLS = {
+    'verb': ['studied', 'worked on', 'finished', 'started', 'talked about', 'practiced'],
+    'thing': ['my math homework', 'the chemistry lab report', 'basketball practice', 'the history essay',
+              'our group project', 'piano lessons', 'the biology exam', 'dinner', 'a new book'],
+    'person': ['my mom', 'my best friend', 'my roommate', 'the teacher', 'my sister', 'the team'],
+    'feeling': ['happy', 'tired', 'stressed', 'excited', 'anxious', 'proud', 'calm', 'frustrated'],
+}
+
+
+def make_diary_texts(count, seed=0, sentences=8):
+    """Distinct diary-like entries: recurring phrasing, Zipf-distributed filler words"""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(seed=seed)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    texts = []
+    for _ in range(count):
+        parts = []
+        for _ in range(sentences):
+            sentence = rng.choice(DIARY_SENTENCES)
+            parts.append(sentence.format(**{key: rng.choice(values) for key, values in DIARY_FILLS.items()}))
+            parts.append(' '.join(rng.choices(vocabulary, weights, k=rng.randint(2, 8))) + '.')
+        texts.append(' '.join(parts))
+    return texts
+
+
+def bench_compression(count=20000):
+    """File size and load time of compressed entry content, and single-entry decode"""
+    import base64
+    import zlib
+    from benchmark_suite import make_diary
+    from diary_compress import ContentCodec
+    from diary_storage import JsonStore, clear_load_caches
+
+    data = make_diary(count, words_per_entry=0)
+    for entry, text in zip(data['entries'], make_diary_texts(count)):
+        entry['content'] = text
+        entry['word_count'] = len(text.split())
+
+    print(f"⏱️  compressed storage of {count} entries")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, compress in [('plain', False), ('dictionary', True)]:
+            store = JsonStore(os.path.join(tmp_dir, f'{name}.json'), compress=compress)
+            start = time.perf_counter()
+            store.save(data)
+            saved = time.perf_counter() - start
+            # Saving again, as the app does after reloading, only compresses new entries
+            reloaded = store.load()
+            start = time.perf_counter()
+            store.save(reloaded)
+            resaved = time.perf_counter() - start
+            clear_load_caches()
+            start = time.perf_counter()
+            JsonStore(store.path).load()
+            loaded = time.perf_counter() - start
+            size = os.path.getsize(store.path)
+            print(f"{name:>16} {size / 2**20:>7.2f} MiB  save {saved:>6.2f} s  "
+                  f"resave {resaved:>6.2f} s  cold load {loaded:>6.2f} s")
+
+    texts = [entry['content'] for entry in data['entries']]
+    raw = sum(len(text.encode()) for text in texts)
+    per_record = sum(len(zlib.compress(text.encode(), 9)) for text in texts)
+    codec = ContentCodec.train(data['entries'])
+    encoded = [codec.compress(text) for text in texts]
+    packed = sum(len(base64.b64decode(text)) for text in encoded)
+    print(f"{'content':>16} raw {raw / 2**20:.2f} MiB, per-record zlib {raw / per_record:.1f}x, "
+          f"dictionary {raw / packed:.1f}x ({len(codec.dictionary)} byte dictionary)")
+    fresh = ContentCodec(codec.dictionary)
+    print(f"{'decode 1 entry':>16} {time_per_call(fresh.decompress, encoded[-1]) * 1e6:>7.1f} µs")
+
+
+def bench_save_latency(count=20000, words_per_entry=400, saves=50, model_delays=(0, 0.02)):
+    """Save Entry latency with analysis inline and in the background.
+
+    ``model_delays`` adds a sleep to every analysis, standing in for a
+    slower analyzer (a model call) than today's keyword matcher.
+    """
+    from unittest import mock
+    import diary_analysis
+    from benchmark_suite import make_diary
+    from diary_background import BackgroundAnalyzer
+    from diary_core import Diary
+    from diary_storage import JournalStore
+
+    texts = [make_entry(words_per_entry, seed=i) for i in range(saves)]
+    analyze_text = diary_analysis.analyze_text
+    print(f"⏱️  save entry into a journal of {count} entries ({words_per_entry} words, uncached)")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for delay in model_delays:
+            def slow_analyze(*args):
+                time.sleep(delay)
+                return analyze_text(*args)
+
+            for name, analyze in [('inline', True), ('background', False)]:
+                path = os.path.join(tmp_dir, f'{name}-{delay}.journal')
+                diary = Diary(JournalStore(path), make_diary(count))
+                diary.save()
+                diary_analysis.analysis_cache.clear()
+                analyzer = BackgroundAnalyzer(enabled=True)
+                futures = []
+                with mock.patch.object(diary_analysis, 'analyze_text', slow_analyze):
+                    start = time.perf_counter()
+                    for text in texts:
+                        entry, changes = diary.add_entry(text, 6, analyze=analyze)
+                        diary.save(changes)
+                        if not analyze:
+                            futures.append((entry['id'], analyzer.submit(entry)))
+                    seconds = (time.perf_counter() - start) / saves
+                    for entry_id, future in futures:
+                        diary.apply_analysis(entry_id, future.result())
+                analyzer.shutdown()
+                label = f"{name} +{delay * 1e3:.0f}ms"
+                print(f"{label:>20} {seconds * 1e3:>7.2f} ms per save")
+
+
+def bench_reflections(users=200, entries_per_user=2000):
+    """Nightly reflection job across user shards, serial and on a process pool"""
+    from benchmark_suite import make_diary
+    from diary_reflection import precompute
+    from diary_storage import get_store
+
+    print(f"⏱️  morning reflections for {users} users of {entries_per_user} entries")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for backend in ('json', 'journal'):
+            data = make_diary(entries_per_user)
+            for user in range(users):
+                get_store(backend, user_id=f'user{user}', data_dir=tmp_dir).save(data)
+            for workers in (1, 4):
+                start = time.perf_counter()
+                done, errors = precompute(tmp_dir, backend, workers=workers)
+                seconds = time.perf_counter() - start
+                label = f"{backend} x{workers}"
+                print(f"{label:>16} {seconds:>7.2f} s  {done / seconds:>7.0f} users/s  ({len(errors)} errors)")
+
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+# Cold-start budget in seconds; exceeding it flags a regression
+STARTUP_BUDGET = {'import': 1.0, 'first_render': 3.0}
+
+# Modules the write page should not need at startup
+HEAVY_MODULES = ['pandas', 'numpy', 'plotly', 'PIL.Image', 'yaml', 'streamlit_authenticator']
+
+# Runs in a fresh interpreter: times app.py's top-level imports, then a first
+# render of the default page through Streamlit's AppTest
+_STARTUP_SCRIPT = """
+import ast, json, sys, time
+app_path, heavy = sys.argv[1], sys.argv[2].split(',')
+import streamlit
+from streamlit.testing.v1 import AppTest
+with open(app_path) as f:
+    tree = ast.parse(f.read())
+imports = ast.Module([node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))], [])
+start = time.perf_counter()
+exec(compile(imports, app_path, 'exec'), {})
+imported = time.perf_counter() - start
+start = time.perf_counter()
+at = AppTest.from_file(app_path, default_timeout=60).run()
+rendered = time.perf_counter() - start
+print(json.dumps({'import': imported, 'first_render': rendered,
+                  'errors': [e.message for e in at.exception],
+                  'loaded': [name for name in heavy if name in sys.modules]}))
+"""
+
+
+def measure_startup(app_path=APP_PATH):
+    """Time app.py's imports and first render in a fresh process"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(app_path),
+                                                                    os.environ.get('PYTHONPATH')])))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output = subprocess.run([sys.executable, '-c', _STARTUP_SCRIPT, app_path, ','.join(HEAVY_MODULES)],
+                                cwd=tmp_dir, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench_startup(runs=3):
+    """Cold-start import and first-render time of app.py against the budget"""
+    results = [measure_startup() for _ in range(runs)]
+    print(f"⏱️  app.py cold start (best of {runs})")
+    for phase, budget in STARTUP_BUDGET.items():
+        best = min(result[phase] for result in results)
+        status = "✅" if best <= budget else "❌ over budget"
+        print(f"{phase:>14} {best * 1e3:>8.0f} ms  (budget {budget * 1e3:.0f} ms) {status}")
+    total = min(result['import'] + result['first_render'] for result in results)
+    print(f"{'total':>14} {total * 1e3:>8.0f} ms")
+    loaded = results[0]['loaded']
+    print(f"{'heavy modules':>14} {', '.join(loaded) if loaded else 'none loaded'}")
+    if results[0]['errors']:
+        print(f"❌ first render raised: {results[0]['errors']}")
+
+
+def run_all_benchmarks():
+    """Run all benchmarks"""
+    print("🚀 Running AI Student Diary benchmarks...\n")
+    bench_startup()
+    print()
+    bench_analyze_entry()
+    print()
+    bench_detect_events()
+    print()
+    bench_mood_page()
+    print()
+    bench_mood_chart()
+    print()
+    bench_entry_pages()
+    print()
+    bench_search()
+    print()
+    bench_export()
+    print()
+    bench_import()
+    print()
+    bench_compression()
+    print()
+    bench_save_latency()
+    print()
+    bench_reflections()
+    print()
+
+
+if __name__ == "__main__":
+    run_all_benchmarks()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the StudentDiaryApp data paths
+
+Generates a deterministic synthetic diary (entries, events and mood points),
+loads it into a real StudentDiaryApp running against a stubbed
+``st.session_state`` and times the app's own methods. Results are written
+as JSON so runs from different commits can be compared, with a relative
+slowdown threshold per metric.
+
+Usage:
+    python benchmark_suite.py --sizes 10000 100000 --output results.json
+    python benchmark_suite.py --output new.json --baseline old.json --threshold 0.2 \\
+        --metric-threshold load_data_cold=0.5
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+from benchmark import make_entry, make_vocabulary
+from diary_analysis import analysis_cache
+from diary_index import EventIndex
+from diary_stats import rebuild_aggregates
+from diary_storage import clear_load_caches, get_store
+
+# Slowdown tolerated before a metric counts as a regression (0.25 = 25%)
+DEFAULT_THRESHOLD = 0.25
+
+# Entries analyzed per call-level measurement
+SAMPLE_SIZE = 200
+
+EVENT_PHRASES = ['math test tomorrow', 'physics exam on {month} {day}', 'quiz in {n} days',
+                 "Priya's birthday party next week", 'project due on {day}th of {month}']
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+
+
+class StubSessionState(dict):
+    """Dict with attribute access, standing in for ``st.session_state``"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    def __delattr__(self, name):
+        del self[name]
+
+
+def make_diary(entry_count, seed=0, start=date(2015, 1, 1), entries_per_day=3,
+               events_per_entry=0.1, moods_per_entry=1.0, words_per_entry=60):
+    """Build a deterministic synthetic diary data dictionary.
+
+    Entries are spread ``entries_per_day`` a day from ``start``; a fraction of
+    them mention dated events. Contents come from a fixed pool, so memory
+    stays reasonable up to a million entries.
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(seed=seed)
+    pool = []
+    for i in range(256):
+        text = make_entry(words_per_entry, seed=seed + i, keyword_density=0.05, vocabulary=vocabulary)
+        if i % 4 == 0:
+            phrase = rng.choice(EVENT_PHRASES).format(month=rng.choice(MONTHS), day=rng.randint(1, 28),
+                                                      n=rng.randint(2, 9))
+            text = f"{text} I have a {phrase}."
+        pool.append(text)
+
+    entries = []
+    mood_history = []
+    for i in range(entry_count):
+        entry_date = (start + timedelta(days=i // entries_per_day)).isoformat()
+        mood = rng.randint(1, 10)
+        content = pool[rng.randrange(len(pool))]
+        entries.append({
+            'id': i + 1,
+            'date': entry_date,
+            'content': content,
+            'mood': mood,
+            'topics': rng.sample(['academic', 'social', 'family', 'cultural'], rng.randint(0, 2)),
+            'word_count': words_per_entry
+        })
+        if rng.random() < moods_per_entry:
+            mood_history.append({'date': entry_date, 'mood': mood, 'note': content[:50] + "..."})
+
+    last_day = start + timedelta(days=entry_count // entries_per_day)
+    events = []
+    for i in range(int(entry_count * events_per_entry)):
+        # Spread over the diary's span plus a year ahead
+        event_date = start + timedelta(days=rng.randint(0, (last_day - start).days + 365))
+        keyword = rng.choice(['Test', 'Exam', 'Quiz', 'Birthday', 'Party', 'Meeting'])
+        events.append({
+            'id': i + 1,
+            'title': keyword,
+            'date': event_date.isoformat(),
+            'description': f'Detected from diary entry #{rng.randint(1, max(entry_count, 1))}',
+            'type': 'academic' if keyword in ('Test', 'Exam', 'Quiz') else 'personal',
+            'priority': 'high' if keyword in ('Test', 'Exam', 'Quiz') else 'medium'
+        })
+
+    return {
+        'entries': entries,
+        'events': events,
+        'mood_history': mood_history,
+        'insights': [],
+        'aggregates': rebuild_aggregates(entries, mood_history)
+    }
+
+
+@contextmanager
+def stubbed_app_environment(backend, directory):
+    """Run with a stub session state, in ``directory``, on ``backend``"""
+    import streamlit as st
+    from streamlit import config
+    from streamlit.logger import set_log_level
+    # Streamlit warns about running outside `streamlit run`
+    config.set_option('global.showWarningOnDirectExecution', False)
+    set_log_level('error')
+    previous = os.getcwd()
+    os.chdir(directory)
+    try:
+        with mock.patch.dict(os.environ, {'DIARY_STORAGE': backend}), \
+                mock.patch.object(st, 'session_state', StubSessionState()):
+            yield st.session_state
+    finally:
+        os.chdir(previous)
+
+
+def best_time(func, setup=None, repeat=3, number=1):
+    """Best average seconds per call over ``repeat`` rounds; ``setup`` runs untimed"""
+    best = float('inf')
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def run_size(entry_count, backend='json', seed=0, repeat=3):
+    """Time the app's data paths on a synthetic diary of ``entry_count`` entries"""
+    data = make_diary(entry_count, seed)
+    rng = random.Random(seed)
+    sample = [data['entries'][rng.randrange(entry_count)]['content'] for _ in range(SAMPLE_SIZE)]
+    today = date.fromisoformat(data['entries'][-1]['date'])
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir, stubbed_app_environment(backend, tmp_dir) as state:
+        import app
+
+        get_store(backend).save(data)
+        del data
+        clear_load_caches()
+        diary = app.StudentDiaryApp()
+
+        def forget_loaded():
+            clear_load_caches()
+            state.pop('data_version', None)
+
+        results['load_data_cold'] = best_time(diary.load_data, forget_loaded, repeat)
+        results['load_data_warm'] = best_time(diary.load_data, repeat=repeat, number=100)
+
+        def analyze_sample():
+            for content in sample:
+                diary.analyze_entry(content, 5)
+
+        results['analyze_entry'] = best_time(analyze_sample, analysis_cache.clear, repeat) / SAMPLE_SIZE
+        results['analyze_entry_cached'] = best_time(analyze_sample, repeat=repeat) / SAMPLE_SIZE
+
+        def detect_sample():
+            for content in sample:
+                diary.detect_calendar_events(content)
+
+        results['detect_calendar_events'] = best_time(detect_sample, repeat=repeat) / SAMPLE_SIZE
+        results['calculate_streak'] = best_time(diary.calculate_streak, repeat=repeat, number=1000)
+        results['calculate_average_mood'] = best_time(diary.calculate_average_mood, repeat=repeat, number=1000)
+
+        def mood_page_prep():
+            mood_series = diary.mood_series()
+            mood_series.stats()
+            mood_series.tail(7)
+            return mood_series
+
+        def forget_mood_series():
+            state.pop('mood_series', None)
+
+        results['mood_page_prep_cold'] = best_time(lambda: mood_page_prep().chart_data('daily'),
+                                                   forget_mood_series, repeat)
+        results['mood_page_prep_warm'] = best_time(mood_page_prep, repeat=repeat, number=100)
+
+        def calendar_page_prep():
+            state.event_index.sync(state.calendar_events)
+            return diary.upcoming_calendar_events(today)
+
+        def forget_event_index():
+            state.event_index = EventIndex()
+
+        results['calendar_page_prep_cold'] = best_time(calendar_page_prep, forget_event_index, repeat)
+        results['calendar_page_prep_warm'] = best_time(calendar_page_prep, repeat=repeat, number=100)
+
+        # Saves last: they change the stored data
+        def append_entry():
+            entry = {'id': len(state.diary_entries) + 1, 'date': today.isoformat(),
+                     'content': sample[0], 'mood': 6, 'topics': [], 'word_count': 60}
+            state.diary_entries.append(entry)
+            diary.save_data([('entries', entry)])
+
+        results['save_data_append'] = best_time(append_entry, repeat=repeat)
+        results['save_data_full'] = best_time(diary.save_data, repeat=repeat)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes=(10000, 100000), backend='json', seed=0, repeat=3, progress=print):
+    """Run every size and return the JSON-ready results document"""
+    results = {}
+    for size in sizes:
+        progress(f"⏱️  {size} entries on {backend}...")
+        results[str(size)] = run_size(size, backend, seed, repeat)
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'backend': backend,
+            'seed': seed
+        },
+        'results': results
+    }
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD, metric_thresholds=None):
+    """Compare two result documents metric by metric.
+
+    Returns a list of (size, metric, baseline seconds, current seconds,
+    relative change, regressed) for every metric present in both.
+    """
+    metric_thresholds = metric_thresholds or {}
+    rows = []
+    for size, metrics in current['results'].items():
+        for metric, seconds in metrics.items():
+            before = baseline['results'].get(size, {}).get(metric)
+            if not before:
+                continue
+            change = seconds / before - 1
+            rows.append((size, metric, before, seconds, change,
+                         change > metric_thresholds.get(metric, threshold)))
+    return rows
+
+
+def format_seconds(seconds):
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} µs"
+
+
+def print_results(document):
+    for size, metrics in document['results'].items():
+        print(f"\n📊 {size} entries")
+        for metric, seconds in metrics.items():
+            print(f"{metric:>26} {format_seconds(seconds):>12}")
+
+
+def parse_metric_thresholds(values):
+    thresholds = {}
+    for value in values or []:
+        metric, _, limit = value.partition('=')
+        thresholds[metric] = float(limit)
+    return thresholds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark StudentDiaryApp data paths on synthetic diaries')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000],
+                        help='diary sizes in entries (default: 10000 100000)')
+    parser.add_argument('--backend', default='json', help='storage backend: json, journal or sqlite')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='results JSON from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative slowdown that counts as a regression (default: 0.25)')
+    parser.add_argument('--metric-threshold', action='append', metavar='METRIC=LIMIT',
+                        help='override the threshold for one metric')
+    args = parser.parse_args()
+
+    document = run_suite(args.sizes, args.backend, args.seed, args.repeat)
+    print_results(document)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        rows = compare_results(baseline, document, args.threshold, parse_metric_thresholds(args.metric_threshold))
+        print(f"\n🔍 Compared with {baseline['meta'].get('commit') or args.baseline}")
+        if baseline['meta'].get('backend') != document['meta']['backend']:
+            print(f"⚠️  Baseline ran on {baseline['meta'].get('backend')}, this run on {document['meta']['backend']}")
+        for size, metric, before, after, change, regressed in rows:
+            status = "❌" if regressed else "✅"
+            print(f"{status} {size:>8} {metric:>26} {format_seconds(before):>10} -> {format_seconds(after):>10} "
+                  f"({change:+.0%})")
+        if any(row[-1] for row in rows):
+            print("❌ Performance regressions found")
+            sys.exit(1)
+        print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
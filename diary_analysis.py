@@ -0,0 +1,462 @@
+"""
+Keyword-based analysis of diary entries.
+
+The lexicons are compiled once at import into a lookup table of whole words,
+including common inflections ("test" also matches "tests", "stress" also
+matches "stressed"). An entry is tokenized in a single pass and each distinct
+word is looked up once, which gives sentiment counts and topic hits together.
+Because matching is by whole word, "class" no longer matches "classic" and
+"fun" no longer matches "funeral".
+"""
+
+import hashlib
+import json
+import re
+import string
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+POSITIVE_WORDS = ['happy', 'excited', 'great', 'amazing', 'wonderful', 'proud', 'success', 'love', 'enjoy', 'fun', 'good', 'nice']
+NEGATIVE_WORDS = ['sad', 'angry', 'frustrated', 'worried', 'scared', 'lonely', 'tired', 'stress', 'fail', 'hate', 'bad', 'terrible']
+
+TOPIC_KEYWORDS = {
+    'academic': ['test', 'exam', 'homework', 'study', 'class', 'teacher', 'school', 'grade', 'assignment', 'project', 'math', 'physics', 'chemistry'],
+    'social': ['friend', 'group', 'party', 'invite', 'lunch', 'play', 'talk', 'share', 'help', 'support'],
+    'family': ['mom', 'dad', 'parent', 'family', 'home', 'house', 'sister', 'brother'],
+    'cultural': ['diwali', 'holi', 'rakhi', 'ganesh', 'festival', 'celebration', 'tradition', 'culture']
+}
+
+# Endings that take "es" rather than "s": classes, stresses, lunches
+_SIBILANT_ENDINGS = ('s', 'x', 'z', 'ch', 'sh')
+
+# Every ASCII separator becomes a space, so one bytes.translate + split tokenizes
+_SEPARATORS = (string.punctuation + string.digits + string.whitespace).encode()
+_TOKEN_TABLE = bytes.maketrans(_SEPARATORS, b' ' * len(_SEPARATORS))
+_UNICODE_PUNCTUATION = re.compile(r'[\u2010-\u206f\u3000-\u303f]')
+
+
+def words(text):
+    """Return the lowercase words of ``text`` in order, as UTF-8 bytes"""
+    text = text.lower()
+    if not text.isascii():
+        text = _UNICODE_PUNCTUATION.sub(' ', text)
+    return text.encode('utf-8').translate(_TOKEN_TABLE).split()
+
+
+def tokenize(text):
+    """Return the set of distinct lowercase words in ``text`` as UTF-8 bytes"""
+    return set(words(text))
+
+
+def inflections(keyword):
+    """The forms of a keyword that count as it: tests, classes, studies, loved, sharing, stressful, happily.
+
+    Endings follow the keyword's spelling, so "fun" doesn't take "d"
+    (fund) and "test" doesn't take "es" (testes).
+    """
+    forms = [keyword, keyword + 'ful']
+    if keyword.endswith('y') and keyword[-2:-1] not in 'aeiou':
+        stem = keyword[:-1]
+        forms += [stem + 'ies', stem + 'ied', keyword + 'ing', stem + 'ily']
+    elif keyword.endswith('e'):
+        forms += [keyword + 's', keyword + 'd', keyword[:-1] + 'ing', keyword + 'ly']
+        if keyword.endswith('le'):
+            forms.append(keyword[:-1] + 'y')
+    else:
+        plural = keyword + ('es' if keyword.endswith(_SIBILANT_ENDINGS) else 's')
+        forms += [plural, keyword + 'ed', keyword + 'ing', keyword + 'ly']
+    return forms
+
+
+def compile_lexicon(categories):
+    """Compile {category: [keywords]} into a word -> (keyword, categories) table"""
+    keyword_categories = {}
+    for category, keywords in categories.items():
+        for keyword in keywords:
+            keyword_categories.setdefault(keyword, []).append(category)
+    # Exact keywords go in first so an inflection never shadows another keyword
+    table = {keyword.encode('utf-8'): (keyword, tuple(found_in))
+             for keyword, found_in in keyword_categories.items()}
+    for keyword, found_in in keyword_categories.items():
+        for form in inflections(keyword):
+            table.setdefault(form.encode('utf-8'), (keyword, tuple(found_in)))
+    return table
+
+
+_LEXICON = {'positive': POSITIVE_WORDS, 'negative': NEGATIVE_WORDS}
+_LEXICON.update(TOPIC_KEYWORDS)
+KEYWORD_TABLE = compile_lexicon(_LEXICON)
+
+# Bump when analyze_text's rules change; lexicon and inflection edits are picked up automatically
+ANALYSIS_RULES_VERSION = 1
+ANALYZER_VERSION = hashlib.sha1(json.dumps(
+    [ANALYSIS_RULES_VERSION, _LEXICON, sorted(word.decode('utf-8') for word in KEYWORD_TABLE)],
+    sort_keys=True).encode()).hexdigest()[:12]
+
+
+def match_keywords(text):
+    """Return {category: set of distinct keywords found} in one pass over ``text``"""
+    hits = {}
+    for word in KEYWORD_TABLE.keys() & tokenize(text):
+        keyword, categories = KEYWORD_TABLE[word]
+        for category in categories:
+            hits.setdefault(category, set()).add(keyword)
+    return hits
+
+
+def analyze_text(entry_text, mood):
+    """Perform basic AI analysis on diary entry text"""
+    analysis = {
+        'sentiment': 'neutral',
+        'topics': [],
+        'stress_level': 'low',
+        'insights': []
+    }
+
+    hits = match_keywords(entry_text)
+
+    # Sentiment analysis
+    positive_count = len(hits.get('positive', ()))
+    negative_count = len(hits.get('negative', ()))
+
+    if positive_count > negative_count:
+        analysis['sentiment'] = 'positive'
+    elif negative_count > positive_count:
+        analysis['sentiment'] = 'negative'
+
+    # Topic detection
+    for topic in TOPIC_KEYWORDS:
+        if topic in hits:
+            analysis['topics'].append(topic)
+
+    # Stress level
+    if mood and mood <= 3:
+        analysis['stress_level'] = 'high'
+    elif negative_count > 2:
+        analysis['stress_level'] = 'medium'
+
+    # Generate insights
+    if analysis['sentiment'] == 'negative':
+        analysis['insights'].append("It's okay to have difficult days. Remember that your feelings are valid and temporary.")
+
+    if 'academic' in analysis['topics']:
+        analysis['insights'].append("You're showing dedication to your studies. Consider breaking large tasks into smaller steps.")
+
+    if 'social' in analysis['topics']:
+        analysis['insights'].append("Human connections are important. Remember that you have people who care about you.")
+
+    if 'cultural' in analysis['topics']:
+        analysis['insights'].append("Your cultural heritage is a beautiful part of who you are. Celebrate it with joy!")
+
+    return analysis
+
+
+def analysis_key(content, mood):
+    """Hash content, mood and analyzer version into a memoization key"""
+    digest = hashlib.sha1(f"{ANALYZER_VERSION}\0{mood}\0".encode())
+    digest.update(content.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _copy_analysis(analysis):
+    return {name: (list(value) if isinstance(value, list) else value)
+            for name, value in analysis.items()}
+
+
+class AnalysisCache:
+    """Bounded LRU cache of analysis results keyed by ``analysis_key``"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, content, mood, key=None):
+        """Return the analysis for content and mood, computing it on a miss"""
+        key = key or analysis_key(content, mood)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return _copy_analysis(self._results[key])
+            self.misses += 1
+        analysis = analyze_text(content, mood)
+        with self._lock:
+            self._results[key] = analysis
+            if len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return _copy_analysis(analysis)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+analysis_cache = AnalysisCache()
+
+
+def stored_analysis(analysis, key):
+    """Return the form of an analysis persisted on an entry (topics live on the entry)"""
+    return {
+        'key': key,
+        'sentiment': analysis['sentiment'],
+        'stress_level': analysis['stress_level'],
+        'insights': list(analysis['insights'])
+    }
+
+
+def entry_analysis(entry):
+    """Return an entry's analysis, from its stored copy when still current.
+
+    Entries saved by an older analyzer, or edited since, are re-analyzed
+    through the LRU cache.
+    """
+    content, mood = entry.get('content', ''), entry.get('mood')
+    key = analysis_key(content, mood)
+    stored = entry.get('analysis')
+    if stored and stored.get('key') == key:
+        return {
+            'sentiment': stored['sentiment'],
+            'topics': list(entry.get('topics', [])),
+            'stress_level': stored['stress_level'],
+            'insights': list(stored['insights'])
+        }
+    return analysis_cache.get(content, mood, key)
+
+
+EVENT_KEYWORDS = ['test', 'exam', 'quiz', 'assignment', 'project', 'birthday', 'party', 'celebration', 'festival', 'meeting', 'appointment']
+ACADEMIC_EVENTS = ['test', 'exam', 'quiz', 'assignment', 'project']
+HIGH_PRIORITY_EVENTS = ['test', 'exam', 'quiz']
+
+# Subjects folded into the event title: "math test" -> "Math Test"
+EVENT_SUBJECTS = ['math', 'maths', 'physics', 'chemistry', 'biology', 'science', 'english',
+                  'hindi', 'sanskrit', 'history', 'geography', 'civics', 'economics', 'computer']
+
+MONTHS = {
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6, 'july': 7,
+    'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12,
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'jun': 6, 'jul': 7, 'aug': 8,
+    'sep': 9, 'sept': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12
+}
+
+# An event keyword only pairs with a date in another sentence if it is this close
+MAX_PAIR_DISTANCE = 80
+
+
+def _alternation(words):
+    return '|'.join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+def _event_forms():
+    forms = {}
+    for keyword in EVENT_KEYWORDS:
+        forms[keyword] = keyword
+        forms[keyword + ('zes' if keyword.endswith('z') else 's')] = keyword
+    forms['parties'] = 'party'
+    return forms
+
+
+EVENT_FORMS = _event_forms()
+
+# One pattern finds sentence breaks, event keywords and every date expression,
+# so an entry is scanned exactly once
+_MONTH = _alternation(MONTHS)
+_EXTRACT_PATTERN = re.compile(r"""
+      (?P<stop>[.!?\n]+)
+    | \b(?:(?P<subject>""" + _alternation(EVENT_SUBJECTS) + r""")\s+)?
+        (?P<event>""" + _alternation(EVENT_FORMS) + r""")\b
+    | \b(?P<relative>day\s+after\s+tomorrow|tomorrow|today|tonight)\b
+    | \bin\s+(?P<count>\d{1,3}|""" + _alternation(NUMBER_WORDS) + r""")\s+(?P<unit>day|week|month)s?\b
+    | \bnext\s+(?P<next_unit>week|month)\b
+    | \b(?:(?P<weekday_modifier>next|this|coming)\s+)?(?P<weekday>""" + _alternation(WEEKDAYS) + r""")\b
+    | \b(?P<month>""" + _MONTH + r""")\.?\s+(?P<month_day>\d{1,2})(?:st|nd|rd|th)?\b
+        (?:,?\s+(?P<month_year>\d{4})\b)?
+    | \b(?P<day>\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?(?P<day_month>""" + _MONTH + r""")\b
+        (?:,?\s+(?P<day_year>\d{4})\b)?
+    | \b(?P<iso>\d{4}-\d{2}-\d{2})\b
+    | \b(?P<numeric_day>\d{1,2})/(?P<numeric_month>\d{1,2})(?:/(?P<numeric_year>\d{2}|\d{4}))?\b
+""", re.VERBOSE)
+
+
+def _as_date(today):
+    today = today or datetime.now()
+    return today.date() if isinstance(today, datetime) else today
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    year, month = day.year + month // 12, month % 12 + 1
+    for candidate in (day.day, 30, 29, 28):
+        try:
+            return day.replace(year=year, month=month, day=candidate)
+        except ValueError:
+            continue
+
+
+def _calendar_date(year, month, day, today, year_given):
+    """Build a date; without a year, dates long past roll over to next year.
+
+    None if the date doesn't exist, including Feb 29 rolled into a non-leap year.
+    """
+    try:
+        resolved = date(year, month, day)
+        if not year_given and (today - resolved).days > 183:
+            resolved = resolved.replace(year=year + 1)
+    except ValueError:
+        return None
+    return resolved
+
+
+def _resolve_date(match, today):
+    """Turn one date-expression match into an absolute date (or None)"""
+    group = match.group
+    relative = group('relative')
+    if relative:
+        if relative.startswith('day'):
+            return today + timedelta(days=2)
+        return today + timedelta(days=1 if relative == 'tomorrow' else 0)
+    if group('unit'):
+        count = group('count')
+        count = int(count) if count.isdigit() else NUMBER_WORDS[count]
+        if group('unit') == 'month':
+            return _add_months(today, count)
+        return today + timedelta(days=count * (7 if group('unit') == 'week' else 1))
+    if group('next_unit'):
+        return _add_months(today, 1) if group('next_unit') == 'month' else today + timedelta(days=7)
+    if group('weekday'):
+        ahead = (WEEKDAYS.index(group('weekday')) - today.weekday()) % 7 or 7
+        if group('weekday_modifier') == 'next' and ahead < 7:
+            ahead += 7
+        return today + timedelta(days=ahead)
+    if group('month'):
+        year = group('month_year')
+        return _calendar_date(int(year or today.year), MONTHS[group('month')],
+                              int(group('month_day')), today, bool(year))
+    if group('day_month'):
+        year = group('day_year')
+        return _calendar_date(int(year or today.year), MONTHS[group('day_month')],
+                              int(group('day')), today, bool(year))
+    if group('iso'):
+        try:
+            return date.fromisoformat(group('iso'))
+        except ValueError:
+            return None
+    year = group('numeric_year')
+    if year and len(year) == 2:
+        year = '20' + year
+    return _calendar_date(int(year or today.year), int(group('numeric_month')),
+                          int(group('numeric_day')), today, bool(year))
+
+
+# Event forms as tokens, and a literal pattern per form to locate them quickly
+_EVENT_TOKENS = {form.encode('utf-8') for form in EVENT_FORMS}
+_EVENT_FORM_PATTERNS = {form.encode('utf-8'): re.compile(r'\b' + form + r'\b') for form in EVENT_FORMS}
+# Padding lets a date expression that starts near a window edge match in full
+_WINDOW_PADDING = 40
+
+
+def _event_windows(text, forms):
+    """Merged (start, end) spans covering each event keyword's sentence and neighbourhood"""
+    spans = []
+    reach = MAX_PAIR_DISTANCE + _WINDOW_PADDING
+    for form in forms:
+        for match in _EVENT_FORM_PATTERNS[form].finditer(text):
+            start, end = match.span()
+            sentence_start = max(text.rfind(stop, 0, start) for stop in '.!?\n') + 1
+            sentence_end = min((i for i in (text.find(stop, end) for stop in '.!?\n') if i >= 0), default=len(text))
+            # Room before the keyword for a subject word like "chemistry"
+            spans.append((max(0, min(sentence_start, start - reach)), min(len(text), max(sentence_end + 1, end + reach))))
+    spans.sort()
+    windows = []
+    for start, end in spans:
+        if windows and start <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], end)
+        else:
+            windows.append([start, end])
+    return windows
+
+
+def extract_events(entry_text, today=None):
+    """Pair each event keyword in text with its nearest date expression.
+
+    Returns a list of (keyword, title, date) with absolute dates. A keyword
+    pairs with the closest date expression in its own sentence (preferring
+    one that follows it), or failing that one within ``MAX_PAIR_DISTANCE``
+    characters. The entry is tokenized once to find event keywords, and
+    only the text around them is scanned for date expressions.
+    """
+    forms = tokenize(entry_text) & _EVENT_TOKENS
+    if not forms:
+        return []
+    today = _as_date(today)
+    text = entry_text.lower()
+    sentence = 0
+    keywords = []
+    dates = []
+    for window_start, window_end in _event_windows(text, forms):
+        # Separate windows never share a sentence
+        sentence += 1
+        for match in _EXTRACT_PATTERN.finditer(text, window_start, window_end):
+            if match.group('stop'):
+                sentence += 1
+            elif match.group('event'):
+                keyword = EVENT_FORMS[match.group('event')]
+                subject = match.group('subject')
+                title = f"{subject.title()} {keyword.title()}" if subject else keyword.title()
+                keywords.append((match.start(), match.end(), sentence, keyword, title))
+            else:
+                resolved = _resolve_date(match, today)
+                if resolved:
+                    dates.append((match.start(), match.end(), sentence, resolved))
+
+    found = []
+    seen = set()
+    for start, end, keyword_sentence, keyword, title in keywords:
+        best = None
+        for date_start, date_end, date_sentence, resolved in dates:
+            distance = date_start - end if date_start >= end else start - date_end
+            same_sentence = date_sentence == keyword_sentence
+            if not same_sentence and distance > MAX_PAIR_DISTANCE:
+                continue
+            # "exam tomorrow and project on friday": later dates win ties
+            rank = (not same_sentence, date_start < start, distance)
+            if best is None or rank < best[0]:
+                best = (rank, resolved)
+        if best and (title, best[1]) not in seen:
+            seen.add((title, best[1]))
+            found.append((keyword, title, best[1]))
+    return found
+
+
+def detect_events(entry_text, today=None):
+    """Detect calendar events in diary entry text.
+
+    ``today`` is the date relative expressions are resolved against
+    (defaults to now). Returned events have no ``id``; callers assign one.
+    """
+    return [{
+        'title': title,
+        'date': event_date.isoformat(),
+        'description': f'Detected from diary entry: "{entry_text[:100]}..."',
+        'type': 'academic' if keyword in ACADEMIC_EVENTS else 'personal',
+        'priority': 'high' if keyword in HIGH_PRIORITY_EVENTS else 'medium'
+    } for keyword, title, event_date in extract_events(entry_text, today)]
+
+
+def parse_date(text, today=None):
+    """Parse the first date expression in text (a week from now if there is none)"""
+    today = _as_date(today)
+    for match in _EXTRACT_PATTERN.finditer(text.lower()):
+        if not (match.group('stop') or match.group('event')):
+            resolved = _resolve_date(match, today)
+            if resolved:
+                return resolved.strftime('%Y-%m-%d')
+    return (today + timedelta(days=7)).strftime('%Y-%m-%d')
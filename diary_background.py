@@ -0,0 +1,92 @@
+"""
+Entry analysis off the save path.
+
+With ``DIARY_BACKGROUND_ANALYSIS=1`` Save Entry stores the raw entry (no
+topics or analysis yet) and returns at once. Analysis and event detection
+run on a small shared thread pool, and the app merges each result into the
+diary (``Diary.apply_analysis``) on a later rerun. Save latency then no
+longer depends on the analyzer or on history size.
+
+At most ``MAX_PENDING`` analyses are queued; past that, entries are analyzed
+inline, so a burst of saves can't pile up unbounded work. Raw entries are saved
+with ``analysis: None``; if a result never arrives (the session ended first)
+the next session re-queues recent ones, ``entry_analysis`` still reads them,
+and ``diary_cli.py reanalyze`` fills in the rest.
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date
+
+from diary_analysis import analysis_cache, analysis_key, detect_events
+from diary_metrics import metrics
+
+ANALYSIS_WORKERS = 2
+
+# Analyses queued or running before saves fall back to analyzing inline
+MAX_PENDING = 32
+
+# Newest entries checked for a missing analysis when a session starts
+RECOVER_RECENT = 50
+
+
+def awaiting_analysis(entry):
+    """Whether an entry was saved raw and its analysis hasn't been merged yet"""
+    return 'analysis' in entry and entry['analysis'] is None
+
+
+def analyze_content(content, mood, today=None):
+    """Analysis and detected events of an entry's text, as merged by ``Diary.apply_analysis``"""
+    key = analysis_key(content, mood)
+    with metrics.span('analyze_entry', words=len(content.split())):
+        analysis = analysis_cache.get(content, mood, key)
+    return {'key': key, 'analysis': analysis, 'events': detect_events(content, today)}
+
+
+class BackgroundAnalyzer:
+    """Bounded thread pool analyzing saved entries"""
+
+    def __init__(self, enabled=False, workers=ANALYSIS_WORKERS, max_pending=MAX_PENDING):
+        self.enabled = enabled
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Configure from ``DIARY_BACKGROUND_ANALYSIS``"""
+        return cls(enabled=os.environ.get('DIARY_BACKGROUND_ANALYSIS', '') not in ('', '0'))
+
+    def submit(self, entry):
+        """Start analyzing a saved entry; returns a Future of ``analyze_content``'s result"""
+        args = (entry.get('content', ''), entry.get('mood'), date.fromisoformat(entry['date']))
+        if not self._slots.acquire(blocking=False):
+            # Too much queued already: analyze now instead of adding to the backlog
+            future = Future()
+            future.set_result(analyze_content(*args))
+            return future
+        try:
+            future = self._pool().submit(analyze_content, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='diary-analysis')
+            return self._executor
+
+    def shutdown(self, wait=True):
+        """Stop the worker threads (a later submit starts new ones)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+background_analyzer = BackgroundAnalyzer.from_env()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Bulk re-analysis of stored diary entries.
+
+``analyze_batch`` runs ``analyze_text`` and ``detect_events`` over any
+iterable of entries in chunks on a process pool and streams the results back
+in order. ``backfill`` uses it to refresh every stored entry's topics, saving
+in bulk and recording a checkpoint after each save so an interrupted run
+picks up where it stopped.
+
+Usage: python diary_batch.py [--backend json] [--checkpoint backfill.ckpt]
+"""
+
+import argparse
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from diary_analysis import ANALYZER_VERSION, analysis_key, analyze_text, detect_events, stored_analysis
+from diary_index import IdAllocator
+from diary_storage import atomic_write, get_store
+
+
+def analyze_record(content, mood, date=None):
+    """Analyze one entry; relative event dates resolve against the entry's date"""
+    today = datetime.strptime(date, '%Y-%m-%d') if date else None
+    result = analyze_text(content, mood)
+    result['key'] = analysis_key(content, mood)
+    result['events'] = detect_events(content, today)
+    return result
+
+
+def _analyze_chunk(chunk):
+    """Worker entry point: analyze a list of (content, mood, date) tuples"""
+    return [analyze_record(*item) for item in chunk]
+
+
+def _chunks(entries, chunk_size):
+    iterator = iter(entries)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def analyze_batch(entries, chunk_size=500, workers=None, start=0):
+    """Analyze entries in chunks, yielding (position, entry, result) in order.
+
+    ``start`` skips entries already processed by an earlier run. With
+    ``workers`` of 0 or 1 everything runs in this process; otherwise chunks
+    are spread over a process pool with at most two chunks per worker in
+    flight, so memory stays bounded however many entries there are.
+    """
+    entries = islice(entries, start, None)
+    position = start
+
+    def payload(chunk):
+        return [(entry.get('content', ''), entry.get('mood'), entry.get('date')) for entry in chunk]
+
+    if workers is not None and workers <= 1:
+        for chunk in _chunks(entries, chunk_size):
+            for entry, result in zip(chunk, _analyze_chunk(payload(chunk))):
+                yield position, entry, result
+                position += 1
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        max_pending = 2 * workers
+        pending = deque()
+        chunks = _chunks(entries, chunk_size)
+        while True:
+            for chunk in islice(chunks, max_pending - len(pending)):
+                pending.append((chunk, pool.submit(_analyze_chunk, payload(chunk))))
+            if not pending:
+                return
+            chunk, future = pending.popleft()
+            for entry, result in zip(chunk, future.result()):
+                yield position, entry, result
+                position += 1
+
+
+def load_checkpoint(path):
+    """Return the number of entries a previous run finished, or 0.
+
+    Checkpoints written by a different analyzer version start over.
+    """
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, 'r') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('analyzer') != ANALYZER_VERSION:
+        return 0
+    return checkpoint.get('position', 0)
+
+
+def save_checkpoint(path, position):
+    if path:
+        atomic_write(path, lambda f: json.dump({'position': position,
+                                                'analyzer': ANALYZER_VERSION,
+                                                'updated': datetime.now().isoformat()}, f))
+
+
+def backfill(store, chunk_size=500, workers=None, checkpoint_path=None,
+             save_every=10000, add_events=True, progress=None):
+    """Re-analyze every stored entry and write refreshed results back in bulk.
+
+    Data is saved every ``save_every`` entries and at the end, and the
+    checkpoint is written only after each save. Loaded entries are shared
+    with the store's load cache, so refreshed entries are new dictionaries
+    written back by id. Returns the number of entries processed in this run.
+    """
+    data = store.load()
+    if data is None:
+        return 0
+    entries = data.get('entries', [])
+    events = data.setdefault('events', [])
+    known_events = {(event['title'], event['date']) for event in events}
+    start = min(load_checkpoint(checkpoint_path), len(entries))
+    ids = IdAllocator(data.setdefault('next_ids', {}))
+    ids.sync('events', events)
+
+    position = start
+    updated, added = [], []
+
+    def save():
+        store.update('entries', updated, data)
+        if added:
+            store.append([('events', event) for event in added] + [('next_ids', ids.state())], data)
+        updated.clear()
+        added.clear()
+
+    for position, entry, result in analyze_batch(entries, chunk_size, workers, start):
+        entry = {**entry, 'topics': result['topics'], 'analysis': stored_analysis(result, result['key'])}
+        entries[position] = entry
+        updated.append(entry)
+        if add_events:
+            for event in result['events']:
+                key = (event['title'], event['date'])
+                if key not in known_events:
+                    known_events.add(key)
+                    added.append({'id': ids.allocate('events'), **event})
+                    events.append(added[-1])
+        position += 1
+        if position % save_every == 0:
+            save()
+            save_checkpoint(checkpoint_path, position)
+        if progress:
+            progress(position, len(entries))
+
+    if updated:
+        save()
+    save_checkpoint(checkpoint_path, position)
+    return position - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-analyze all stored diary entries')
+    parser.add_argument('--backend', help='storage backend (default: DIARY_STORAGE or json)')
+    parser.add_argument('--user', help='user shard to process when DIARY_DATA_DIR is set')
+    parser.add_argument('--checkpoint', help='checkpoint file for resumable runs')
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--no-events', action='store_true', help="don't add detected calendar events")
+    args = parser.parse_args()
+
+    store = get_store(args.backend, user_id=args.user)
+    count = backfill(store, args.chunk_size, args.workers, args.checkpoint,
+                     add_events=not args.no_events)
+    print(f"✅ Re-analyzed {count} entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Command-line bulk operations on a stored diary, without Streamlit.
+
+Usage:
+    python diary_cli.py import backup.json|backup.ndjson[.gz] [--replace]
+    python diary_cli.py export [backup.json | backup.ndjson | backup.ndjson.gz]
+    python diary_cli.py reanalyze [--checkpoint backfill.ckpt] [--workers N]
+    python diary_cli.py aggregates [--check]
+    python diary_cli.py compact
+    python diary_cli.py delete entry|event ID
+
+``--backend`` and ``--user`` pick the store the same way the app does
+(``DIARY_STORAGE`` and ``DIARY_DATA_DIR``).
+"""
+
+import argparse
+import json
+import sys
+
+from diary_batch import backfill
+from diary_core import Diary
+from diary_export import write_backup
+from diary_import import IMPORT_BATCH_SIZE, import_backup
+from diary_storage import get_store
+
+
+def import_command(diary, args):
+    if args.replace:
+        diary.reset()
+        diary.save()
+
+    def progress(read, total):
+        done = f"{read}/{total}" if total else str(read)
+        print(f"\r⏳ {done} records read", end='', file=sys.stderr, flush=True)
+
+    stats = import_backup(diary, args.file, args.batch_size, progress=None if args.quiet else progress)
+    if not args.quiet:
+        print(file=sys.stderr)
+    for error in stats['errors']:
+        print(f"⚠️  {error}")
+    added = stats['added']
+    print(f"✅ Imported {added['entries']} entries, {added['events']} events and "
+          f"{added['mood_history']} mood records ({stats['duplicates']} duplicates skipped, "
+          f"{stats['invalid']} invalid); {len(diary.entries)} entries in total")
+
+
+def export_command(diary, args):
+    if args.file and (args.file.endswith('.ndjson') or args.file.endswith('.ndjson.gz')):
+        written = write_backup(args.file, diary.data())
+        print(f"✅ Exported {len(diary.entries)} entries to {args.file} ({written} bytes)")
+        return
+    data = diary.export_data()
+    if args.file:
+        with open(args.file, 'w') as f:
+            json.dump(data, f, indent=2, default=str)
+        print(f"✅ Exported {len(diary.entries)} entries to {args.file}")
+    else:
+        json.dump(data, sys.stdout, indent=2, default=str)
+        print()
+
+
+def reanalyze_command(diary, args):
+    count = backfill(diary.store, args.chunk_size, args.workers, args.checkpoint,
+                     add_events=not args.no_events)
+    print(f"✅ Re-analyzed {count} entries")
+
+
+def aggregates_command(diary, args):
+    if args.check:
+        if diary.aggregates_consistent():
+            print("✅ Aggregates are up to date")
+            return 0
+        print("❌ Aggregates differ from a rebuild; run without --check to fix them")
+        return 1
+    diary.rebuild_aggregates()
+    diary.save([('aggregates', diary.aggregates)])
+    print(f"✅ Rebuilt aggregates over {diary.aggregates['total_entries']} entries")
+
+
+def compact_command(diary, args):
+    diary.compact()
+    print("✅ Storage compacted")
+
+
+def delete_command(diary, args):
+    delete = diary.delete_entry if args.collection == 'entry' else diary.delete_event
+    if not delete(args.id):
+        print(f"❌ No {args.collection} with id {args.id}")
+        return 1
+    print(f"✅ Deleted {args.collection} {args.id}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Bulk operations on a stored diary')
+    parser.add_argument('--backend', help='storage backend (default: DIARY_STORAGE or json)')
+    parser.add_argument('--user', help='user shard to use when DIARY_DATA_DIR is set')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('import', help='add entries from a backup or data file')
+    command.add_argument('file', help='JSON export, data file or NDJSON backup (optionally gzipped)')
+    command.add_argument('--replace', action='store_true', help='replace the diary instead of merging')
+    command.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    command.add_argument('--quiet', action='store_true', help="don't report progress")
+    command.set_defaults(handler=import_command)
+
+    command = commands.add_parser('export', help='write the diary as a JSON or NDJSON backup')
+    command.add_argument('file', nargs='?', help='output file (default: stdout); '
+                                                '.ndjson and .ndjson.gz stream a chunked backup')
+    command.set_defaults(handler=export_command)
+
+    command = commands.add_parser('reanalyze', help='re-run analysis over every entry')
+    command.add_argument('--checkpoint', help='checkpoint file for resumable runs')
+    command.add_argument('--chunk-size', type=int, default=500)
+    command.add_argument('--workers', type=int, default=None)
+    command.add_argument('--no-events', action='store_true', help="don't add detected calendar events")
+    command.set_defaults(handler=reanalyze_command)
+
+    command = commands.add_parser('aggregates', help='recompute the quick stats')
+    command.add_argument('--check', action='store_true', help='only report whether they are stale')
+    command.set_defaults(handler=aggregates_command)
+
+    command = commands.add_parser('compact', help='rewrite storage without superseded records')
+    command.set_defaults(handler=compact_command)
+
+    command = commands.add_parser('delete', help='remove one entry or calendar event by id')
+    command.add_argument('collection', choices=('entry', 'event'))
+    command.add_argument('id', type=int)
+    command.set_defaults(handler=delete_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    diary = Diary.open(get_store(args.backend, user_id=args.user))
+    return args.handler(diary, args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
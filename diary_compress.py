@@ -0,0 +1,228 @@
+"""
+Dictionary-trained compression of entry content.
+
+Diary entries are short, so compressing each one on its own gains little:
+deflate has no history to refer back to. A preset dictionary built from the
+user's own entries (their frequent words and phrases) gives every entry that
+history up front. ``train_dictionary`` picks the word n-grams that save the
+most bytes and packs them into a zlib ``zdict``, best ones last where
+back-references are cheapest. ``ContentCodec`` compresses one entry body at
+a time as raw deflate with that dictionary, base64-encoded so it can live in
+JSON next to the entry's uncompressed metadata. Loaded entries are
+``PackedEntry`` objects, which decompress their body only when it is read.
+"""
+
+import base64
+import hashlib
+import re
+import zlib
+from collections import Counter, OrderedDict
+
+# zlib back-references reach 32 KiB, so a bigger dictionary can't help
+DICTIONARY_SIZE = 32 * 1024
+
+# Entries sampled for training (the newest ones); more barely helps
+TRAINING_SAMPLE = 1000
+
+# Retrain once the diary has grown this many times over since training,
+# so re-encoding everything stays amortized O(1) per entry
+RETRAIN_GROWTH = 2
+
+COMPRESSION_LEVEL = 9
+
+# Entries written since the last load whose compressed form is remembered
+ENCODE_MEMO_SIZE = 4096
+
+_SEGMENTS = re.compile(r'\S+\s*')
+
+
+def train_dictionary(texts, size=DICTIONARY_SIZE, max_ngram=3):
+    """Build a compression dictionary from sample texts.
+
+    Word n-grams (with their trailing whitespace) are scored by how many
+    bytes they would save across the samples; the best fill the dictionary,
+    ordered so the most valuable sit at its end.
+    """
+    counts = Counter()
+    for text in texts:
+        segments = _SEGMENTS.findall(text)
+        for n in range(1, max_ngram + 1):
+            counts.update(''.join(segments[i:i + n]) for i in range(len(segments) - n + 1))
+
+    # A match shorter than 4 bytes isn't worth a back-reference
+    scored = sorted(((count - 1) * (len(gram.encode('utf-8')) - 3), gram)
+                    for gram, count in counts.items() if count > 1 and len(gram) > 3)
+    chosen = []
+    used = 0
+    for score, gram in reversed(scored):
+        if score <= 0:
+            break
+        encoded = gram.encode('utf-8')
+        if used + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        used += len(encoded)
+    return b''.join(reversed(chosen))
+
+
+class PackedEntry(dict):
+    """An entry whose ``content`` stays compressed until it is first read.
+
+    Lookups, iteration, copies, comparisons and ``json.dumps`` all see the
+    plain entry; the first one that needs ``content`` decompresses it and
+    keeps the text. The compressed form is kept too, so saving the entry
+    again costs nothing, unless ``content`` is assigned a new value.
+    """
+
+    __slots__ = ('codec', 'content_z')
+    __hash__ = None
+
+    def __init__(self, fields, codec, content_z, content=None):
+        super().__init__(fields)
+        self.codec = codec
+        self.content_z = content_z
+        if content is not None:
+            dict.__setitem__(self, 'content', content)
+
+    def packed(self):
+        """The stored form: the other fields plus ``content_z``"""
+        packed = {key: value for key, value in dict.items(self) if key != 'content'}
+        packed['content_z'] = self.content_z
+        return packed
+
+    def _unpack(self):
+        if self.content_z is not None and not dict.__contains__(self, 'content'):
+            dict.__setitem__(self, 'content', self.codec.decompress(self.content_z))
+
+    def __missing__(self, key):
+        if key == 'content' and self.content_z is not None:
+            self._unpack()
+            return dict.__getitem__(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key == 'content':
+            self._unpack()
+        return dict.get(self, key, default)
+
+    def __setitem__(self, key, value):
+        if key == 'content':
+            self.content_z = None
+        dict.__setitem__(self, key, value)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or (key == 'content' and self.content_z is not None)
+
+    def __len__(self):
+        return dict.__len__(self) + (self.content_z is not None and not dict.__contains__(self, 'content'))
+
+    def __iter__(self):
+        self._unpack()
+        return dict.__iter__(self)
+
+    def keys(self):
+        self._unpack()
+        return dict.keys(self)
+
+    def values(self):
+        self._unpack()
+        return dict.values(self)
+
+    def items(self):
+        self._unpack()
+        return dict.items(self)
+
+    def copy(self):
+        return dict(self.items())
+
+    def __reduce__(self):
+        return dict, (dict(self.items()),)
+
+    def __eq__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        # Different entries usually differ in id, which needs no decompressing
+        if len(self) != len(other) or dict.get(self, 'id') != other.get('id'):
+            return False
+        self._unpack()
+        if isinstance(other, PackedEntry):
+            other._unpack()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+
+class ContentCodec:
+    """Compresses entry bodies against one shared dictionary"""
+
+    def __init__(self, dictionary, trained_on=0):
+        self.dictionary = dictionary
+        self.trained_on = trained_on
+        self.dictionary_id = hashlib.sha1(dictionary).hexdigest()[:12]
+        # Content -> encoded form of recently written entries; loaded entries
+        # carry their own (``PackedEntry``), so this only needs the new ones
+        self._encoded = OrderedDict()
+        # Loading the dictionary hashes all of it; copying a primed compressor
+        # skips that and halves the cost of compressing an entry
+        self._compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS,
+                                            zdict=dictionary)
+
+    @classmethod
+    def train(cls, entries, sample=TRAINING_SAMPLE):
+        """Train a codec on the newest ``sample`` entries"""
+        texts = [entry.get('content', '') for entry in entries[-sample:]]
+        return cls(train_dictionary(texts), trained_on=len(entries))
+
+    def needs_retraining(self, entry_count):
+        return entry_count >= max(self.trained_on, 1) * RETRAIN_GROWTH
+
+    def compress(self, text):
+        """Return ``text`` as base64 raw deflate against the dictionary"""
+        encoded = self._encoded.get(text)
+        if encoded is not None:
+            self._encoded.move_to_end(text)
+            return encoded
+        compressor = self._compressor.copy()
+        packed = compressor.compress(text.encode('utf-8')) + compressor.flush()
+        encoded = self._encoded[text] = base64.b64encode(packed).decode('ascii')
+        if len(self._encoded) > ENCODE_MEMO_SIZE:
+            self._encoded.popitem(last=False)
+        return encoded
+
+    def decompress(self, encoded):
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS, zdict=self.dictionary)
+        return (decompressor.decompress(base64.b64decode(encoded)) + decompressor.flush()).decode('utf-8')
+
+    def pack_entry(self, entry):
+        """Entry with ``content`` replaced by ``content_z``; other fields untouched"""
+        if (isinstance(entry, PackedEntry) and entry.content_z is not None
+                and entry.codec.dictionary_id == self.dictionary_id):
+            return entry.packed()
+        if 'content' not in entry:
+            return entry
+        packed = {key: value for key, value in entry.items() if key != 'content'}
+        packed['content_z'] = self.compress(entry['content'])
+        return packed
+
+    def unpack_entry(self, entry, content=None):
+        """A ``PackedEntry`` for a stored entry, decompressed when first read.
+
+        ``content``, when the text is already known, saves decompressing it.
+        """
+        if 'content_z' not in entry:
+            return entry
+        fields = {key: value for key, value in entry.items() if key != 'content_z'}
+        return PackedEntry(fields, self, entry['content_z'], content)
+
+    def to_json(self):
+        return {
+            'id': self.dictionary_id,
+            'trained_on': self.trained_on,
+            'data': base64.b64encode(self.dictionary).decode('ascii')
+        }
+
+    @classmethod
+    def from_json(cls, document):
+        return cls(base64.b64decode(document['data']), document.get('trained_on', 0))
@@ -0,0 +1,350 @@
+"""
+Headless diary model.
+
+``Diary`` holds one user's collections (entries, calendar events, mood
+history, insights) with their aggregates and event index, and implements the
+operations the app performs on them: adding entries and events, detecting
+events, quick stats, import/export, re-analysis and persistence through a
+store. It never touches Streamlit, so scripts, the CLI and benchmarks can
+run bulk jobs at full speed; the app wraps its session state in a ``Diary``
+and delegates to it.
+
+Record ids come from a persisted ``IdAllocator`` and are never reused, so
+entries and events can be looked up, edited and deleted by id. Stores check
+new ids against the stored counters when they write, so sessions with stale
+counters can't hand out an id twice. Older diaries that numbered several
+events alike are renumbered the first time they are loaded.
+"""
+
+from datetime import date, datetime
+
+from diary_analysis import analysis_cache, analysis_key, detect_events, stored_analysis
+from diary_import import COLLECTION_KEYS, import_records
+from diary_index import EventIndex, IdAllocator, RecordIndex
+from diary_metrics import metrics
+from diary_stats import (aggregates_consistent, average_mood, current_streak, empty_aggregates,
+                         rebuild_aggregates, update_aggregates)
+
+# Mood notes keep the start of the entry
+MOOD_NOTE_LENGTH = 50
+
+
+class Diary:
+    """One user's diary data and the operations on it"""
+
+    def __init__(self, store=None, data=None, event_index=None, entry_index=None):
+        self.store = store
+        self.event_index = event_index if event_index is not None else EventIndex()
+        self.entry_index = entry_index if entry_index is not None else RecordIndex()
+        if data is not None:
+            self.set_data(data)
+        else:
+            self.entries, self.events, self.mood_history, self.insights = [], [], [], []
+            self.aggregates = empty_aggregates()
+            self.ids = IdAllocator()
+
+    @classmethod
+    def open(cls, store):
+        """Load a diary from ``store``; an empty diary if nothing is stored"""
+        diary = cls(store)
+        diary.load()
+        return diary
+
+    def set_data(self, data):
+        """Take collections from a storage-format data dictionary.
+
+        Returns whether records sharing an id had to be renumbered.
+        """
+        self.entries = data.get('entries', [])
+        self.events = data.get('events', [])
+        self.mood_history = data.get('mood_history', [])
+        self.insights = data.get('insights', [])
+        self.aggregates = data.get('aggregates')
+        # Data saved before aggregates existed (or edited by hand) gets rebuilt
+        if not self.aggregates or self.aggregates.get('total_entries') != len(self.entries):
+            self.rebuild_aggregates()
+        self.ids = IdAllocator(data.get('next_ids'))
+        self.ids.sync('entries', self.entries)
+        self.ids.sync('events', self.events)
+        renumbered = (self.ids.renumber_duplicates('entries', self.entries)
+                      + self.ids.renumber_duplicates('events', self.events))
+        if renumbered:
+            self.event_index.rebuild(self.events)
+            self.entry_index.rebuild(self.entries)
+        else:
+            # Lists are usually only appended to, so only new records need indexing
+            self.event_index.sync(self.events)
+            self.entry_index.sync(self.entries)
+        return renumbered > 0
+
+    def data(self):
+        """Return the collections as a storage-format data dictionary"""
+        return {
+            'entries': self.entries,
+            'events': self.events,
+            'mood_history': self.mood_history,
+            'insights': self.insights,
+            'aggregates': self.aggregates,
+            'next_ids': self.ids.next_ids
+        }
+
+    def load(self):
+        """Replace the collections with the stored ones; False if nothing is stored.
+
+        Legacy data with duplicate ids is saved back once renumbered, so ids
+        stay the same from one load to the next.
+        """
+        data = self.store.load()
+        if data is None:
+            return False
+        if self.set_data(data):
+            self.save()
+        return True
+
+    def save(self, changes=None):
+        """Persist the diary.
+
+        When ``changes`` lists the new (collection, record) pairs, backends
+        that support it append just those records instead of rewriting
+        everything.
+        """
+        data = self.data()
+        with metrics.span('save_data', entries=len(self.entries), records=len(changes or ())) as span:
+            written = self.store.bytes_written
+            if changes:
+                if self.store.append(changes, data):
+                    # Another session used some of these ids first; the store renumbered ours
+                    self.entry_index.rebuild(self.entries)
+                    self.event_index.rebuild(self.events)
+            else:
+                self.store.save(data)
+            span.set(bytes_written=self.store.bytes_written - written)
+
+    def save_updates(self, collection, records):
+        """Persist changed records of a collection, matched by id"""
+        with metrics.span('save_data', entries=len(self.entries), records=len(records)) as span:
+            written = self.store.bytes_written
+            self.store.update(collection, records, self.data())
+            span.set(bytes_written=self.store.bytes_written - written)
+
+    def compact(self):
+        """Rewrite storage without superseded records"""
+        self.store.compact()
+
+    def reset(self):
+        """Remove every record in memory; ids carry on counting rather than start over"""
+        self.set_data({'next_ids': self.ids.state()})
+
+    def clear(self):
+        """Remove every record, in memory and in storage, keeping the id counters"""
+        self.reset()
+        if self.store is not None:
+            self.store.clear()
+            self.save()
+
+    def create_entry(self, content, mood, now=None, analyze=True):
+        """Build (and unless told not to, analyze) a new entry without adding it"""
+        now = now or datetime.now()
+        content = content.strip()
+        entry = {
+            'id': self.ids.peek('entries'),
+            'date': now.strftime('%Y-%m-%d'),
+            'content': content,
+            'mood': mood,
+            'topics': [],
+            'word_count': len(content.split()),
+            'timestamp': now.isoformat()
+        }
+        if not analyze:
+            # None marks an entry still waiting for its analysis
+            entry['analysis'] = None
+            return entry
+        with metrics.span('analyze_entry', words=entry['word_count']):
+            key = analysis_key(content, mood)
+            analysis = analysis_cache.get(content, mood, key)
+        entry['topics'] = analysis['topics']
+        entry['analysis'] = stored_analysis(analysis, key)
+        return entry
+
+    def add_entry(self, content, mood, now=None, analyze=True):
+        """Add a diary entry with its mood record and detected events.
+
+        Returns (entry, changes), where ``changes`` are the new
+        (collection, record) pairs to pass to ``save``. Without ``analyze``
+        the entry is added raw, to be completed by ``apply_analysis``.
+        """
+        entry = self.create_entry(content, mood, now, analyze)
+        entry['id'] = self.ids.allocate('entries')
+        content = entry['content']
+        self.entries.append(entry)
+        self.entry_index.add(entry)
+        changes = [('entries', entry)]
+
+        mood_entry = None
+        if mood:
+            mood_entry = {
+                'date': entry['date'],
+                'mood': mood,
+                'note': content[:MOOD_NOTE_LENGTH] + "..." if len(content) > MOOD_NOTE_LENGTH else content
+            }
+            self.mood_history.append(mood_entry)
+            changes.append(('mood_history', mood_entry))
+
+        self.aggregates = update_aggregates(self.aggregates, entry, mood_entry)
+        changes.append(('aggregates', self.aggregates))
+
+        # Relative dates ("on Friday") count from the entry's own date
+        if analyze:
+            changes.extend(self.add_new_events(self.detect_events(content, date.fromisoformat(entry['date']))))
+        changes.append(('next_ids', self.ids.state()))
+        return entry, changes
+
+    def add_new_events(self, events):
+        """Add the events not already in the calendar; returns their changes"""
+        return [('events', self.add_event(event)) for event in events
+                if not self.event_index.contains(event['title'], event['date'])]
+
+    def apply_analysis(self, entry_id, result):
+        """Merge a background analysis (``diary_background``) into its entry and save.
+
+        The entry gets its topics and analysis, and the events found in it
+        are added. Results for entries edited or deleted since are dropped.
+        Returns the added events, or None if the result was dropped.
+        """
+        entry = self.get_entry(entry_id)
+        if entry is None or analysis_key(entry.get('content', ''), entry.get('mood')) != result['key']:
+            return None
+        updated = dict(entry, topics=result['analysis']['topics'],
+                       analysis=stored_analysis(result['analysis'], result['key']))
+        self.entries[self.entries.index(entry)] = updated
+        self.entry_index.replace(entry, updated)
+        self.save_updates('entries', [updated])
+
+        changes = self.add_new_events(result['events'])
+        if changes:
+            self.save(changes + [('next_ids', self.ids.state())])
+        return [event for _, event in changes]
+
+    @metrics.timed('detect_calendar_events')
+    def detect_events(self, content, today=None):
+        """Detect calendar events in text, numbered as they would be if added"""
+        first_id = self.ids.peek('events')
+        return [{'id': first_id + i, **event} for i, event in enumerate(detect_events(content, today))]
+
+    def add_event(self, event):
+        """Add a calendar event under a newly allocated id"""
+        event = dict(event, id=self.ids.allocate('events'))
+        self.events.append(event)
+        self.event_index.add(event)
+        return event
+
+    def get_entry(self, entry_id):
+        """Return the entry with ``entry_id``, or None"""
+        return self.entry_index.sync(self.entries).get(entry_id)
+
+    def get_event(self, event_id):
+        """Return the calendar event with ``event_id``, or None"""
+        return self.event_index.get(event_id)
+
+    def update_entry(self, entry_id, content=None, mood=None):
+        """Change an entry's text and/or mood, re-analyzing it and saving the diary.
+
+        The entry keeps its id, date and timestamp. Returns the updated
+        entry, or None if there is no such entry.
+        """
+        entry = self.get_entry(entry_id)
+        if entry is None:
+            return None
+        updated = self.create_entry(entry.get('content', '') if content is None else content,
+                                    entry.get('mood') if mood is None else mood)
+        updated.update(id=entry['id'], date=entry['date'])
+        if 'timestamp' in entry:
+            updated['timestamp'] = entry['timestamp']
+        # A new dict rather than an in-place edit: loaded records are shared with the load cache
+        self.entries[self.entries.index(entry)] = updated
+        self.entry_index.replace(entry, updated)
+        self.rebuild_aggregates()
+        self.save_updates('entries', [updated])
+        self.save([('aggregates', self.aggregates)])
+        return updated
+
+    def delete_entry(self, entry_id):
+        """Remove an entry and save the diary; False if there is no such entry"""
+        entry = self.get_entry(entry_id)
+        if entry is None:
+            return False
+        self.entries.remove(entry)
+        self.entry_index.remove(entry, self.entries)
+        self.rebuild_aggregates()
+        self.save()
+        return True
+
+    def update_event(self, event_id, **fields):
+        """Change fields of a calendar event and save the diary; None if there is no such event"""
+        event = self.get_event(event_id)
+        if event is None:
+            return None
+        updated = {**event, **fields, 'id': event['id']}
+        self.events[self.events.index(event)] = updated
+        self.event_index.rebuild(self.events)
+        self.save_updates('events', [updated])
+        return updated
+
+    def delete_event(self, event_id):
+        """Remove a calendar event and save the diary; False if there is no such event"""
+        event = self.get_event(event_id)
+        if event is None:
+            return False
+        self.events.remove(event)
+        self.event_index.rebuild(self.events)
+        self.save()
+        return True
+
+    def upcoming_events(self, today=None, limit=10, days=30):
+        """Next events within ``days``, with the days until each"""
+        today = today or date.today()
+        return [(event, (date.fromisoformat(event['date']) - today).days)
+                for event in self.event_index.upcoming(today, limit=limit, days=days)]
+
+    def streak(self, today=None):
+        """Consecutive days of writing up to today"""
+        return current_streak(self.aggregates, today)
+
+    def average_mood(self):
+        """Average of the most recent moods"""
+        return average_mood(self.aggregates)
+
+    def rebuild_aggregates(self):
+        """Recompute quick stats from the full history"""
+        self.aggregates = rebuild_aggregates(self.entries, self.mood_history)
+        return self.aggregates
+
+    def aggregates_consistent(self):
+        return aggregates_consistent(self.aggregates, self.entries, self.mood_history)
+
+    def export_data(self, profile=None):
+        """Return the app's JSON backup document"""
+        data = {
+            'diary_entries': self.entries,
+            'calendar_events': self.events,
+            'mood_history': self.mood_history,
+            'export_date': datetime.now().isoformat()
+        }
+        if profile is not None:
+            data['user_profile'] = profile
+        return data
+
+    def import_data(self, data, replace=False):
+        """Add entries, events and mood records from a backup or storage file.
+
+        Accepts both the export format and the storage format. Records are
+        validated, and ones the diary already has are skipped (see
+        ``diary_import``); new records are numbered after the existing ones.
+        With ``replace`` the diary is emptied first. Nothing is saved.
+        Returns the number of entries added.
+        """
+        if replace:
+            self.reset()
+        records = ((COLLECTION_KEYS[key], record) for key, value in data.items()
+                   if key in COLLECTION_KEYS and isinstance(value, list) for record in value)
+        return import_records(self, records, save=False)['added']['entries']
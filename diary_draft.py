@@ -0,0 +1,108 @@
+"""
+Autosaved drafts of the entry being written.
+
+The text and mood of the unsaved entry go to a small per-user draft file
+next to the diary data (``diary_data.draft``), never to the diary itself, so
+typing doesn't pay for serializing the history. Writes are debounced: an
+update schedules one write ``DRAFT_DELAY`` seconds later, and further
+updates before then only change what that write stores.
+"""
+
+import json
+import os
+import threading
+import weakref
+from datetime import datetime
+
+from diary_storage import atomic_write
+
+# Seconds between a change and the write that stores it
+DRAFT_DELAY = 2.0
+
+EMPTY_DRAFT = {'text': '', 'mood': None}
+
+
+def draft_path(store):
+    """Return the draft path kept next to a store's data file"""
+    return os.path.splitext(store.path)[0] + '.draft'
+
+
+class DraftSaver:
+    """Debounced writer of one user's draft file"""
+
+    def __init__(self, path, delay=DRAFT_DELAY):
+        self.path = path
+        self.delay = delay
+        self.writes = 0
+        # Held while writing too, so a discard can't be undone by a late write
+        self._lock = threading.Lock()
+        self._pending = None
+        self._saved = None
+        self._timer = None
+
+    def load(self):
+        """Return the stored draft ({'text', 'mood', 'updated'}), or None"""
+        try:
+            with open(self.path, 'r') as f:
+                draft = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return draft if isinstance(draft, dict) and isinstance(draft.get('text'), str) else None
+
+    def update(self, text, mood):
+        """Note the current draft; it is written after ``delay`` unless unchanged"""
+        draft = {'text': text, 'mood': mood}
+        with self._lock:
+            if self._saved is None and self._pending is None:
+                # A new saver compares with what is on disk, not with an empty draft
+                stored = self.load()
+                self._saved = {'text': stored['text'], 'mood': stored.get('mood')} if stored else EMPTY_DRAFT
+            if draft == (self._pending or self._saved):
+                return
+            self._pending = draft
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Write the pending draft now; an empty draft removes the file"""
+        with self._lock:
+            draft, self._pending = self._pending, None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if draft is None:
+                return
+            if draft['text'].strip() or draft['mood'] is not None:
+                atomic_write(self.path, lambda f: json.dump(dict(draft, updated=datetime.now().isoformat()), f))
+            elif os.path.exists(self.path):
+                os.remove(self.path)
+            self._saved = draft
+            self.writes += 1
+
+    def discard(self):
+        """Drop the draft, pending or written (the entry was saved or cleared)"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending = None
+            self._saved = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+# Savers live while a session's app or a pending write holds them, not for the whole process
+_savers = weakref.WeakValueDictionary()
+_savers_lock = threading.Lock()
+
+
+def draft_saver(store):
+    """Return the process-wide draft saver for a store's user, so reruns share its timer"""
+    path = draft_path(store)
+    with _savers_lock:
+        saver = _savers.get(path)
+        if saver is None:
+            saver = _savers[path] = DraftSaver(path)
+        return saver
@@ -0,0 +1,130 @@
+"""
+Streaming diary backups.
+
+A backup is newline-delimited JSON: a header record with the schema version
+and per-collection counts, then one record per entry, event, mood record and
+insight::
+
+    {"type": "header", "schema_version": 1, "counts": {"entries": 2, ...}, ...}
+    {"type": "entries", "record": {"id": 1, "date": "2025-01-15", ...}}
+
+``export_chunks`` serializes records a chunk at a time and can gzip them on
+the fly, so writing a backup never holds more than one chunk of JSON (plus the
+compressor's window) however large the diary is. ``read_backup`` streams the
+records back, transparently decompressing.
+"""
+
+import gzip
+import json
+import zlib
+from datetime import datetime
+
+from diary_storage import atomic_write
+
+EXPORT_SCHEMA_VERSION = 1
+
+# Collections in the order they are written
+EXPORT_COLLECTIONS = ('entries', 'events', 'mood_history', 'insights')
+
+# Records serialized per chunk
+EXPORT_CHUNK_SIZE = 1000
+
+_GZIP_MAGIC = b'\x1f\x8b'
+
+
+def backup_header(data, profile=None):
+    """Header record describing a backup of ``data``"""
+    header = {
+        'type': 'header',
+        'schema_version': EXPORT_SCHEMA_VERSION,
+        'exported_at': datetime.now().isoformat(),
+        'counts': {collection: len(data.get(collection) or []) for collection in EXPORT_COLLECTIONS}
+    }
+    if profile is not None:
+        header['user_profile'] = profile
+    return header
+
+
+def ndjson_chunks(data, profile=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the backup of ``data`` as UTF-8 NDJSON, ``chunk_size`` records at a time"""
+    yield (json.dumps(backup_header(data, profile), default=str) + '\n').encode('utf-8')
+    for collection in EXPORT_COLLECTIONS:
+        records = data.get(collection) or []
+        prefix = f'{{"type": "{collection}", "record": '
+        for start in range(0, len(records), chunk_size):
+            yield ''.join(prefix + json.dumps(record, default=str) + '}\n'
+                          for record in records[start:start + chunk_size]).encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of byte chunks into one gzip stream"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_chunks(data, profile=None, compress=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield a backup of ``data`` as byte chunks, gzipped if ``compress``"""
+    chunks = ndjson_chunks(data, profile, chunk_size)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def write_backup(path, data, profile=None, compress=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream a backup of ``data`` to ``path``; ``.gz`` paths are compressed by default.
+
+    Returns the number of bytes written.
+    """
+    if compress is None:
+        compress = path.endswith('.gz')
+    written = []
+    atomic_write(path, lambda f: written.append(write_backup_to(f, data, profile, compress, chunk_size)),
+                 mode='wb')
+    return written[0]
+
+
+def write_backup_to(f, data, profile=None, compress=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream a backup into an open binary file; returns the bytes written"""
+    written = 0
+    for chunk in export_chunks(data, profile, compress, chunk_size):
+        f.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def open_backup(path):
+    """Open a backup for reading text, decompressing gzip backups"""
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == _GZIP_MAGIC
+    return gzip.open(path, 'rt', encoding='utf-8') if compressed else open(path, 'r', encoding='utf-8')
+
+
+def read_backup(path):
+    """Return (header, records) where records yields (collection, record) lazily.
+
+    Raises ``ValueError`` for files that aren't NDJSON backups or were
+    written by a newer schema.
+    """
+    f = open_backup(path)
+    try:
+        header = json.loads(f.readline() or 'null')
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get('type') != 'header':
+        f.close()
+        raise ValueError(f"{path} is not a diary backup")
+    if header.get('schema_version', 0) > EXPORT_SCHEMA_VERSION:
+        f.close()
+        raise ValueError(f"{path} uses backup schema {header['schema_version']}, "
+                         f"newer than {EXPORT_SCHEMA_VERSION}")
+
+    def records():
+        with f:
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    yield item['type'], item['record']
+
+    return header, records()
@@ -0,0 +1,283 @@
+"""
+In-memory indexes over diary data.
+
+``EventIndex`` keeps calendar events ordered by date so the calendar page can
+answer "next N events" and date-range queries by bisection instead of sorting
+and parsing every event on each render; it also finds events by id and by
+(title, date) in O(1). ``RecordIndex`` finds entries by id, and
+``EntryOrder`` pages through them by date. ``IdAllocator``
+hands out record ids that are never reused, so ids stay unique (and the
+indexes stay valid) after records are deleted or merged in; stores check
+them against the stored counters with ``reserve_ids`` when they write.
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import date
+
+
+class IdAllocator:
+    """Monotonic ids per collection, persisted with the data as ``next_ids``.
+
+    ``next_ids`` is shared, not copied, so a dictionary kept in session state
+    sees every allocation.
+    """
+
+    def __init__(self, next_ids=None):
+        self.next_ids = next_ids if next_ids is not None else {}
+
+    def sync(self, collection, records):
+        """Make sure the next id is past every id in ``records``.
+
+        Ids are allocated in order, so normally only the last record needs
+        checking; data saved before ids were allocated gets a full scan.
+        Only integer ids count; records keyed otherwise aren't allocated here.
+        """
+        next_id = self.next_ids.get(collection, 1)
+        last = records[-1].get('id') if records else None
+        if isinstance(last, int) and last >= next_id:
+            next_id = max((record['id'] for record in records if isinstance(record.get('id'), int)),
+                          default=0) + 1
+        self.next_ids[collection] = next_id
+        return next_id
+
+    def renumber_duplicates(self, collection, records):
+        """Give every record whose id an earlier record already has a new id.
+
+        Diaries saved before ids were allocated here could number several
+        events alike. The first record keeps the id; the others are replaced
+        in ``records`` by copies under fresh ids. Returns how many were renumbered.
+        """
+        seen = set()
+        renumbered = 0
+        for i, record in enumerate(records):
+            record_id = record.get('id')
+            if not isinstance(record_id, int):
+                continue
+            if record_id in seen:
+                records[i] = dict(record, id=self.allocate(collection))
+                renumbered += 1
+            else:
+                seen.add(record_id)
+        return renumbered
+
+    def peek(self, collection):
+        """The id the next ``allocate`` will return"""
+        return self.next_ids.get(collection, 1)
+
+    def allocate(self, collection):
+        record_id = self.next_ids.get(collection, 1)
+        self.next_ids[collection] = record_id + 1
+        return record_id
+
+    def state(self):
+        """Snapshot of the next ids, for saving"""
+        return dict(self.next_ids)
+
+
+# Collections whose records get ids from an IdAllocator
+ID_COLLECTIONS = ('entries', 'events')
+
+
+def stored_next_ids(data):
+    """Next ids implied by stored data: its ``next_ids`` and the ids it holds"""
+    ids = IdAllocator(dict(data.get('next_ids') or {}))
+    for collection in ID_COLLECTIONS:
+        ids.sync(collection, data.get(collection) or [])
+    return ids.next_ids
+
+
+def merge_next_ids(next_ids, stored):
+    """Advance ``next_ids`` in place past the stored counters; returns it"""
+    for collection, next_id in stored.items():
+        next_ids[collection] = max(next_ids.get(collection, 1), next_id)
+    return next_ids
+
+
+def reserve_ids(changes, next_ids, stored):
+    """Renumber new records whose ids were taken by another session.
+
+    Sessions allocate ids from their own copy of the counters, which is
+    stale once another session (a second tab, the CLI) has saved. Called
+    with the write lock held and ``stored`` read under it, this gives each
+    new record in ``changes`` whose id is below the stored counter the next
+    free id, in place, and advances the session's ``next_ids``. Returns the
+    changes, with a ``next_ids`` record holding the merged counters if they
+    changed or were already being saved, and whether anything was renumbered.
+    """
+    merge_next_ids(next_ids, stored)
+    reserved = []
+    renumbered = False
+    save_ids = False
+    for collection, record in changes:
+        if collection == 'next_ids':
+            save_ids = True
+            continue
+        if collection in ID_COLLECTIONS and isinstance(record.get('id'), int):
+            save_ids = True
+            if record['id'] < stored.get(collection, 1):
+                record['id'] = next_ids.get(collection, 1)
+                renumbered = True
+            next_ids[collection] = max(next_ids.get(collection, 1), record['id'] + 1)
+        reserved.append((collection, record))
+    if save_ids:
+        reserved.append(('next_ids', dict(next_ids)))
+    return reserved, renumbered
+
+
+class RecordIndex:
+    """Records by id, kept up to date with an append-only list like ``EventIndex``"""
+
+    def __init__(self, records=()):
+        self.rebuild(records)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, record_id):
+        return record_id in self._by_id
+
+    def get(self, record_id):
+        return self._by_id.get(record_id)
+
+    def add(self, record):
+        self._by_id[record.get('id')] = record
+        self._count += 1
+        self._last = record
+
+    def replace(self, old, new):
+        """Point the index at ``new``, which took ``old``'s place in the list"""
+        self._by_id.pop(old.get('id'), None)
+        self._by_id[new.get('id')] = new
+        if self._last is old:
+            self._last = new
+
+    def remove(self, record, records):
+        """Forget a record just removed from ``records``"""
+        self._by_id.pop(record.get('id'), None)
+        self._count = len(records)
+        self._last = records[-1] if records else None
+
+    def rebuild(self, records):
+        self._by_id = {record.get('id'): record for record in records}
+        self._count = len(records)
+        self._last = records[-1] if records else None
+
+    def sync(self, records):
+        """Index new records appended to ``records``, rebuilding if it changed otherwise"""
+        count = self._count
+        if count <= len(records) and (count == 0 or records[count - 1] == self._last):
+            for record in records[count:]:
+                self.add(record)
+        else:
+            self.rebuild(records)
+        return self
+
+
+class EntryOrder:
+    """Entry positions ordered by (date, position), for paging newest first.
+
+    Like ``EventIndex`` it follows an append-only list: new entries are
+    bisected into place (usually at the end), anything else rebuilds it.
+    """
+
+    def __init__(self, entries=()):
+        self.rebuild(entries)
+
+    def rebuild(self, entries):
+        self._keys = sorted((entry['date'], i) for i, entry in enumerate(entries))
+        self._count = len(entries)
+        self._last = entries[-1] if entries else None
+
+    def sync(self, entries):
+        """Order new entries appended to ``entries``, rebuilding if it changed otherwise"""
+        count = self._count
+        if count <= len(entries) and (count == 0 or entries[count - 1] == self._last):
+            for i in range(count, len(entries)):
+                key = (entries[i]['date'], i)
+                self._keys.insert(bisect_right(self._keys, key), key)
+            self._count = len(entries)
+            self._last = entries[-1] if entries else None
+        else:
+            self.rebuild(entries)
+        return self
+
+    def page(self, page, page_size, start=None, end=None):
+        """Positions on one page, newest first, and the total; ``start``/``end`` are inclusive ISO dates"""
+        low = bisect_left(self._keys, (start,)) if start else 0
+        high = bisect_right(self._keys, (end, self._count)) if end else len(self._keys)
+        total = max(high - low, 0)
+        last = high - page * page_size
+        first = max(low, last - page_size)
+        return [i for _, i in reversed(self._keys[first:last])] if last > low else [], total
+
+
+class EventIndex:
+    """Calendar events ordered by (date ordinal, insertion order)"""
+
+    def __init__(self, events=()):
+        self._keys = []
+        self._events = []
+        self._added = []
+        self._by_id = {}
+        self._titles = Counter()
+        self.sync(events)
+
+    def __len__(self):
+        return len(self._added)
+
+    def add(self, event):
+        """Index one event in O(log n) comparisons"""
+        key = (date.fromisoformat(event['date']).toordinal(), len(self._added))
+        position = bisect_right(self._keys, key)
+        self._keys.insert(position, key)
+        self._events.insert(position, event)
+        self._added.append(event)
+        self._by_id[event.get('id')] = event
+        self._titles[event['title'], event['date']] += 1
+
+    def rebuild(self, events):
+        """Index ``events`` from scratch"""
+        self._added = list(events)
+        order = sorted(range(len(self._added)),
+                       key=lambda i: (self._added[i]['date'], i))
+        self._keys = [(date.fromisoformat(self._added[i]['date']).toordinal(), i) for i in order]
+        self._events = [self._added[i] for i in order]
+        self._by_id = {event.get('id'): event for event in self._added}
+        self._titles = Counter((event['title'], event['date']) for event in self._added)
+
+    def get(self, event_id):
+        """Return the event with ``event_id``, or None"""
+        return self._by_id.get(event_id)
+
+    def contains(self, title, day):
+        """Whether an event with this title is on ``day`` (an ISO date)"""
+        return self._titles[title, day] > 0
+
+    def sync(self, events):
+        """Bring the index up to date with an append-only events list.
+
+        When the indexed events are still a prefix of ``events`` only the new
+        tail is added; otherwise the index is rebuilt.
+        """
+        count = len(self._added)
+        if count <= len(events) and (count == 0 or events[count - 1] == self._added[-1]):
+            for event in events[count:]:
+                self.add(event)
+        else:
+            self.rebuild(events)
+        return self
+
+    def between(self, start, end):
+        """Return events dated from ``start`` to ``end`` inclusive, by date"""
+        low = bisect_left(self._keys, (start.toordinal(),))
+        high = bisect_left(self._keys, (end.toordinal() + 1,))
+        return self._events[low:high]
+
+    def upcoming(self, today, limit=10, days=None):
+        """Return the next ``limit`` events from ``today`` (within ``days`` if given)"""
+        low = bisect_left(self._keys, (today.toordinal(),))
+        high = len(self._keys)
+        if days is not None:
+            high = bisect_left(self._keys, (today.toordinal() + days + 1,))
+        return self._events[low:min(high, low + limit)]
@@ -0,0 +1,201 @@
+"""
+Opt-in timing of diary operations.
+
+Set ``DIARY_METRICS`` to record how long each rerun spends loading, saving,
+analysing and rendering. Every timed operation is a span with a duration and
+optional sizes (entry count, bytes written). The latest durations per
+operation are kept in a bounded window for p50/p95/p99, and can be exported:
+
+- ``DIARY_METRICS=1``: in memory only, for the sidebar debug panel
+- ``DIARY_METRICS=prometheus``: a Prometheus text file, rewritten each rerun
+- ``DIARY_METRICS=jsonl``: one JSON line per span, appended each rerun
+
+``DIARY_METRICS_PATH`` overrides the export file. When metrics are off,
+``span`` hands back a shared no-op object, so instrumented code pays one
+attribute check per call.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+from diary_storage import atomic_write
+
+# Durations kept per operation for percentiles
+SAMPLE_WINDOW = 1000
+
+PERCENTILES = (50, 95, 99)
+
+EXPORT_PATHS = {
+    'prometheus': 'diary_metrics.prom',
+    'jsonl': 'diary_metrics.jsonl'
+}
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Span:
+    """One timed operation; sizes can be added while it runs"""
+
+    __slots__ = ('metrics', 'name', 'sizes', 'start')
+
+    def __init__(self, metrics, name, sizes):
+        self.metrics = metrics
+        self.name = name
+        self.sizes = sizes
+
+    def set(self, **sizes):
+        self.sizes.update(sizes)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        # Spans cut short by st.rerun() or an error are still recorded
+        self.metrics.record(self.name, time.perf_counter() - self.start, self.sizes)
+        return False
+
+
+class _NullSpan:
+    """Stand-in span used while metrics are disabled"""
+
+    __slots__ = ()
+
+    def set(self, **sizes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Metrics:
+    """Per-operation timings shared by every session in the process"""
+
+    def __init__(self, enabled=False, export=None, path=None, window=SAMPLE_WINDOW):
+        self.enabled = enabled
+        self.export = export
+        self.path = path or EXPORT_PATHS.get(export)
+        self.window = window
+        self._samples = {}
+        self._totals = {}
+        self._sizes = {}
+        self._pending = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Configure from ``DIARY_METRICS`` and ``DIARY_METRICS_PATH``"""
+        setting = os.environ.get('DIARY_METRICS', '').strip().lower()
+        if setting in ('', '0', 'off', 'false', 'no'):
+            return cls()
+        export = setting if setting in EXPORT_PATHS else None
+        return cls(enabled=True, export=export, path=os.environ.get('DIARY_METRICS_PATH'))
+
+    def span(self, name, **sizes):
+        """Context manager timing ``name``; a no-op when disabled"""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, sizes)
+
+    def timed(self, name=None):
+        """Decorator timing every call of a function as one span"""
+        def decorate(func):
+            span_name = name or func.__name__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with Span(self, span_name, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def record(self, name, seconds, sizes=None):
+        """Add one finished span"""
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(seconds)
+            count, total = self._totals.get(name, (0, 0.0))
+            self._totals[name] = (count + 1, total + seconds)
+            if sizes:
+                self._sizes.setdefault(name, {}).update(sizes)
+            if self.export == 'jsonl':
+                self._pending.append({'ts': round(time.time(), 3), 'op': name,
+                                      'seconds': round(seconds, 6), **(sizes or {})})
+
+    def summary(self):
+        """Return per-operation count, total, p50/p95/p99 and last sizes"""
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self._samples.items()}
+            totals = dict(self._totals)
+            sizes = {name: dict(values) for name, values in self._sizes.items()}
+        summary = {}
+        for name, values in sorted(snapshot.items()):
+            count, total = totals[name]
+            row = {'count': count, 'total': total}
+            for p in PERCENTILES:
+                row[f'p{p}'] = percentile(values, p)
+            row['sizes'] = sizes.get(name, {})
+            summary[name] = row
+        return summary
+
+    def prometheus_text(self):
+        """Render the summary in the Prometheus text exposition format"""
+        lines = ['# HELP diary_operation_seconds Time spent in diary operations',
+                 '# TYPE diary_operation_seconds summary']
+        summary = self.summary()
+        for name, row in summary.items():
+            for p in PERCENTILES:
+                lines.append(f'diary_operation_seconds{{operation="{name}",quantile="{p / 100}"}} {row[f"p{p}"]:.6f}')
+            lines.append(f'diary_operation_seconds_sum{{operation="{name}"}} {row["total"]:.6f}')
+            lines.append(f'diary_operation_seconds_count{{operation="{name}"}} {row["count"]}')
+        lines.append('# HELP diary_operation_size Sizes seen by the latest run of an operation')
+        lines.append('# TYPE diary_operation_size gauge')
+        for name, row in summary.items():
+            for size, value in sorted(row['sizes'].items()):
+                lines.append(f'diary_operation_size{{operation="{name}",size="{size}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        """Write the export file, if one is configured"""
+        if not self.enabled or not self.path:
+            return
+        if self.export == 'prometheus':
+            text = self.prometheus_text()
+            atomic_write(self.path, lambda f: f.write(text))
+        elif self.export == 'jsonl':
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if pending:
+                with open(self.path, 'a') as f:
+                    f.write(''.join(json.dumps(record) + '\n' for record in pending))
+
+    def reset(self):
+        """Forget every recorded span"""
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+            self._sizes.clear()
+            self._pending.clear()
+
+
+metrics = Metrics.from_env()
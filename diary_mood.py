@@ -0,0 +1,228 @@
+"""
+Columnar mood history.
+
+``MoodSeries`` keeps mood records as parallel arrays -- ``datetime64[D]``
+dates and ``int8`` moods, with notes in a separate list -- ordered by date.
+The mood page computes its statistics and chart straight from the arrays
+instead of building a DataFrame from the list of dicts on every render.
+
+For long histories ``chart_data`` resamples to daily, weekly or monthly
+buckets and downsamples with largest-triangle-three-buckets (LTTB), so the
+chart sends at most a fixed number of points to the browser.
+"""
+
+from datetime import date
+from itertools import count
+
+import numpy as np
+
+# Capacity of a new series; it doubles whenever it fills up
+INITIAL_CAPACITY = 64
+
+# Most points a mood chart draws
+POINT_BUDGET = 500
+
+# Chart modes offered on the mood page, by resample frequency
+CHART_MODES = {'Daily': 'daily', 'Weekly': 'weekly', 'Monthly': 'monthly', 'All points': 'raw'}
+
+# Versions are unique across series, so a cache keyed on one never mixes them up
+_versions = count(1)
+
+
+def bucket_dates(dates, frequency):
+    """Map ``datetime64[D]`` dates to the first day of their bucket"""
+    if frequency == 'daily':
+        return dates
+    if frequency == 'weekly':
+        # Day 4 of the epoch (1970-01-05) is a Monday
+        days = dates.astype(np.int64)
+        return ((days - 4) // 7 * 7 + 4).astype('datetime64[D]')
+    if frequency == 'monthly':
+        return dates.astype('datetime64[M]').astype('datetime64[D]')
+    raise ValueError(f"Unknown resample frequency: {frequency}")
+
+
+def resample(dates, moods, frequency):
+    """Aggregate date-ordered moods into buckets.
+
+    Returns (bucket dates, mean, min, max) arrays.
+    """
+    if not len(dates):
+        empty = np.empty(0)
+        return dates, empty, empty, empty
+    buckets = bucket_dates(dates, frequency)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    counts = np.diff(np.r_[starts, len(buckets)])
+    values = moods.astype(np.float64)
+    return (buckets[starts],
+            np.add.reduceat(values, starts) / counts,
+            np.minimum.reduceat(values, starts),
+            np.maximum.reduceat(values, starts))
+
+
+def lttb(x, y, threshold):
+    """Indices of ``threshold`` points that keep the shape of (x, y).
+
+    Largest-triangle-three-buckets: the first and last points are kept, and
+    each bucket in between contributes the point forming the largest
+    triangle with the previous pick and the next bucket's average.
+    """
+    size = len(x)
+    if threshold >= size or threshold < 3:
+        return np.arange(size)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = np.linspace(1, size - 1, threshold - 1).astype(np.int64)
+    picks = np.empty(threshold, dtype=np.int64)
+    picks[0], picks[-1] = 0, size - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        next_low, next_high = high, edges[bucket + 2] if bucket + 2 < len(edges) else size
+        next_x = x[next_low:max(next_high, next_low + 1)].mean()
+        next_y = y[next_low:max(next_high, next_low + 1)].mean()
+        areas = np.abs((x[previous] - next_x) * (y[low:high] - y[previous])
+                       - (x[previous] - x[low:high]) * (next_y - y[previous]))
+        previous = low + int(np.argmax(areas))
+        picks[bucket + 1] = previous
+    return picks
+
+
+class MoodSeries:
+    """Mood records in date order, stored column by column"""
+
+    def __init__(self, mood_history=()):
+        self._dates = np.empty(INITIAL_CAPACITY, dtype='datetime64[D]')
+        self._moods = np.empty(INITIAL_CAPACITY, dtype=np.int8)
+        self._notes = []
+        self._size = 0
+        self._last_added = None
+        self.version = next(_versions)
+        self.sync(mood_history)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def dates(self):
+        """Dates as a ``datetime64[D]`` array view"""
+        return self._dates[:self._size]
+
+    @property
+    def moods(self):
+        """Moods as an ``int8`` array view"""
+        return self._moods[:self._size]
+
+    @property
+    def notes(self):
+        return self._notes
+
+    @property
+    def nbytes(self):
+        """Memory held by the date and mood columns"""
+        return self._dates.nbytes + self._moods.nbytes
+
+    def _grow(self, size):
+        capacity = len(self._dates)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name in ('_dates', '_moods'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def add(self, mood_entry):
+        """Insert one mood record, keeping date order.
+
+        Records dated on or after the newest one are appended in amortized
+        O(1); back-dated records are inserted after any of the same date.
+        """
+        self._grow(self._size + 1)
+        day = np.datetime64(mood_entry['date'], 'D')
+        size = self._size
+        if size == 0 or day >= self._dates[size - 1]:
+            position = size
+        else:
+            position = int(np.searchsorted(self._dates[:size], day, side='right'))
+            self._dates[position + 1:size + 1] = self._dates[position:size]
+            self._moods[position + 1:size + 1] = self._moods[position:size]
+        self._dates[position] = day
+        self._moods[position] = mood_entry['mood']
+        self._notes.insert(position, mood_entry.get('note', ''))
+        self._size += 1
+        self._last_added = mood_entry
+        self.version = next(_versions)
+
+    def rebuild(self, mood_history):
+        """Load ``mood_history`` from scratch"""
+        mood_history = list(mood_history)
+        dates = np.array([mood_entry['date'] for mood_entry in mood_history], dtype='datetime64[D]')
+        order = np.argsort(dates, kind='stable')
+        self._size = 0
+        self._grow(len(mood_history))
+        self._size = len(mood_history)
+        self._dates[:self._size] = dates[order]
+        self._moods[:self._size] = [mood_history[i]['mood'] for i in order]
+        self._notes = [mood_history[i].get('note', '') for i in order]
+        self._last_added = mood_history[-1] if mood_history else None
+        self.version = next(_versions)
+
+    def sync(self, mood_history):
+        """Bring the series up to date with an append-only mood history.
+
+        When the records already added are still a prefix of
+        ``mood_history`` only the new tail is added; otherwise the series is
+        rebuilt.
+        """
+        count = self._size
+        if count <= len(mood_history) and (count == 0 or mood_history[count - 1] == self._last_added):
+            for mood_entry in mood_history[count:]:
+                self.add(mood_entry)
+        else:
+            self.rebuild(mood_history)
+        return self
+
+    def stats(self):
+        """Return mean, max, min and count of the moods"""
+        moods = self.moods
+        if not self._size:
+            return {'mean': 0.0, 'max': 0, 'min': 0, 'count': 0}
+        return {
+            'mean': float(moods.mean()),
+            'max': int(moods.max()),
+            'min': int(moods.min()),
+            'count': self._size
+        }
+
+    def tail(self, n):
+        """Return the latest ``n`` records as (date, mood, note), oldest first"""
+        start = max(0, self._size - n)
+        return [(date.fromisoformat(str(day)), int(mood), note)
+                for day, mood, note in zip(self._dates[start:self._size],
+                                           self._moods[start:self._size],
+                                           self._notes[start:self._size])]
+
+    def chart_data(self, frequency='daily', budget=POINT_BUDGET):
+        """Points for the mood chart, at most ``budget`` of them.
+
+        Returns a dict of ``x`` (dates) and ``y`` (mood, or bucket mean)
+        arrays, plus ``low``/``high`` bucket bands unless ``frequency`` is
+        ``'raw'``.
+        """
+        if frequency == 'raw':
+            x, y = self.dates, self.moods
+            low = high = None
+        else:
+            x, y, low, high = resample(self.dates, self.moods, frequency)
+        picks = lttb(x.astype(np.int64), y, budget)
+        if len(picks) == len(x):
+            picks = slice(None)
+        return {
+            'x': x[picks],
+            'y': y[picks],
+            'low': None if low is None else low[picks],
+            'high': None if high is None else high[picks]
+        }
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Precomputed morning reflections.
+
+``morning_reflection`` turns a user's latest entry into the greeting on the
+insights page. ``precompute`` builds every user's reflection for a day ahead
+of time and writes it to a small ``diary_data.reflection`` file next to
+their data, spreading users over a process pool; schedule it early each
+morning (cron, Task Scheduler). The insights page then only reads that file,
+and computes the reflection itself when it is missing, from another day, or
+the user has written since.
+
+Usage: python diary_reflection.py [--backend json] [--data-dir DIR] [--workers N] [--date YYYY-MM-DD]
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+from diary_analysis import entry_analysis
+from diary_storage import atomic_write, get_store, iter_shards, shard_store
+
+REFLECTIONS = {
+    None: {
+        'message': 'A new day begins with endless possibilities.',
+        'encouragement': 'Your thoughts and feelings matter.',
+        'action': 'Today\'s focus: Write about what\'s on your mind.'
+    },
+    'negative': {
+        'message': 'Yesterday\'s challenges show your strength in facing difficulties.',
+        'encouragement': 'Remember, every challenge you face makes you stronger.',
+        'action': 'Today\'s focus: Take one step at a time.'
+    },
+    'positive': {
+        'message': 'Yesterday\'s positive energy is still with you today!',
+        'encouragement': 'Keep that momentum going - you\'re doing great!',
+        'action': 'Today\'s focus: Build on yesterday\'s success.'
+    },
+    'neutral': {
+        'message': 'A new day brings new opportunities.',
+        'encouragement': 'You have the power to make today amazing.',
+        'action': 'Today\'s focus: What would make you proud?'
+    }
+}
+
+
+def morning_reflection(entry):
+    """Create the morning reflection on an entry (None before the first entry)"""
+    sentiment = entry_analysis(entry)['sentiment'] if entry else None
+    return {'greeting': 'Good morning!', **REFLECTIONS.get(sentiment, REFLECTIONS['neutral'])}
+
+
+def reflection_path(store):
+    """Return the reflection path kept next to a store's data file"""
+    return os.path.splitext(store.path)[0] + '.reflection'
+
+
+def latest_entry(store):
+    """The newest stored entry, read through the store's tail index when it has one"""
+    entries = store.recent_entries(1)
+    if not entries:
+        entries = (store.load() or {}).get('entries', [])[-1:]
+    return entries[0] if entries else None
+
+
+def write_reflection(store, day):
+    """Compute and store a user's reflection for ``day``; returns it"""
+    entry = latest_entry(store)
+    reflection = dict(morning_reflection(entry), date=day.isoformat(),
+                      entry_id=entry.get('id') if entry else None,
+                      generated=datetime.now().isoformat())
+    atomic_write(reflection_path(store), lambda f: json.dump(reflection, f))
+    return reflection
+
+
+def load_reflection(store, day, entry_id):
+    """The stored reflection if it was made for ``day`` from entry ``entry_id``, else None"""
+    try:
+        with open(reflection_path(store), 'r') as f:
+            reflection = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if reflection.get('date') != day.isoformat() or reflection.get('entry_id') != entry_id:
+        return None
+    return reflection
+
+
+def _reflect_shard(job):
+    """Worker entry point: write one shard's reflection, returning an error message or None"""
+    directory, backend, day = job
+    try:
+        write_reflection(shard_store(directory, backend), date.fromisoformat(day))
+    except Exception as e:
+        return f"{directory}: {e}"
+    return None
+
+
+def precompute(data_dir=None, backend=None, day=None, workers=None):
+    """Write the reflection for ``day`` (default: today) for every user.
+
+    With a ``data_dir`` (default: ``DIARY_DATA_DIR``) every user shard is
+    processed, ``workers`` processes at a time; otherwise the single store
+    in the working directory is. Returns (users done, error messages).
+    """
+    backend = backend or os.environ.get('DIARY_STORAGE', 'json')
+    data_dir = data_dir or os.environ.get('DIARY_DATA_DIR')
+    day = day or date.today()
+    if not data_dir:
+        write_reflection(get_store(backend), day)
+        return 1, []
+
+    jobs = [(directory, backend, day.isoformat()) for directory in iter_shards(data_dir)]
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(jobs) <= 1:
+        results = [_reflect_shard(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_reflect_shard, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    errors = [error for error in results if error]
+    return len(jobs) - len(errors), errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute every user's morning reflection")
+    parser.add_argument('--backend', help='storage backend (default: DIARY_STORAGE or json)')
+    parser.add_argument('--data-dir', help='sharded data directory (default: DIARY_DATA_DIR)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--date', type=date.fromisoformat, default=None, help='day to prepare (default: today)')
+    args = parser.parse_args(argv)
+
+    done, errors = precompute(args.data_dir, args.backend, args.date, args.workers)
+    for error in errors:
+        print(f"⚠️  {error}")
+    print(f"✅ Prepared morning reflections for {done} users")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
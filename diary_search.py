@@ -0,0 +1,274 @@
+"""
+Full-text search over diary entries.
+
+``SearchIndex`` is an inverted index with positional postings: for every word
+it records which entries contain it and where, so quoted phrases can be
+matched and results ranked with BM25. Postings are kept in compact ``array``
+buffers that numpy scores without copying.
+
+The index is persisted next to the diary data as a gzipped JSON snapshot
+plus an append-only log of the entries added since, so saving an entry
+writes one line and startup does not re-tokenize the whole diary.
+"""
+
+import gzip
+import json
+import math
+import os
+import re
+from array import array
+from datetime import date
+
+import numpy as np
+
+from diary_analysis import words
+from diary_storage import atomic_write, file_lock
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Logged entries before the snapshot is rewritten and the log emptied
+COMPACT_AFTER = 500
+
+# Bumped whenever the snapshot layout or tokenization changes
+INDEX_FORMAT = 2
+
+_PHRASE = re.compile(r'"([^"]+)"')
+
+
+def search_index_path(store):
+    """Return the index path kept next to a store's data file"""
+    return os.path.splitext(store.path)[0] + '.search'
+
+
+def _as_numpy(buffer):
+    return np.frombuffer(buffer, dtype=buffer.typecode) if len(buffer) else np.empty(0, dtype=buffer.typecode)
+
+
+class SearchIndex:
+    """Positional inverted index over entry content, in entry order"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.log_path = path + '.log' if path else None
+        self._reset()
+
+    def _reset(self):
+        # word -> (document numbers, offsets into positions, positions)
+        self.postings = {}
+        self.entry_ids = []
+        self.days = array('i')
+        self.moods = array('b')
+        self.lengths = array('I')
+        self.total_length = 0
+        self._logged = 0
+
+    def __len__(self):
+        return len(self.entry_ids)
+
+    @classmethod
+    def open(cls, path):
+        """Load a persisted index (snapshot plus log), or start an empty one.
+
+        A snapshot that can't be read or is from another format is dropped
+        with its log, so ``sync`` re-indexes the diary from scratch.
+        """
+        index = cls(path)
+        if os.path.exists(path):
+            try:
+                index._load_snapshot()
+            except (OSError, EOFError, ValueError, KeyError, TypeError):
+                index.clear()
+                return index
+        if os.path.exists(index.log_path):
+            with open(index.log_path, 'r') as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        break  # Torn write from an interrupted save
+                    record = json.loads(line)
+                    index._logged += 1
+                    # Documents already in the snapshot are skipped
+                    if record['n'] == len(index):
+                        index.add(record['entry'], persist=False)
+        return index
+
+    def add(self, entry, persist=True):
+        """Index one entry appended to the diary"""
+        doc = len(self.entry_ids)
+        tokens = words(entry.get('content', ''))
+        positions = {}
+        for position, word in enumerate(tokens):
+            positions.setdefault(word, []).append(position)
+        for word, found in positions.items():
+            postings = self.postings.get(word)
+            if postings is None:
+                postings = self.postings[word] = (array('I'), array('I'), array('I'))
+            docs, offsets, flat = postings
+            docs.append(doc)
+            offsets.append(len(flat))
+            flat.extend(found)
+
+        self.entry_ids.append(entry.get('id'))
+        self.days.append(date.fromisoformat(entry['date']).toordinal())
+        self.moods.append(entry.get('mood') or 0)
+        self.lengths.append(len(tokens))
+        self.total_length += len(tokens)
+        if persist:
+            self._log([(doc, entry)])
+
+    def sync(self, entries):
+        """Bring the index up to date with an append-only entries list.
+
+        When the indexed entries are still a prefix of ``entries`` only the
+        new tail is indexed; otherwise the index is rebuilt and saved.
+        """
+        count = len(self)
+        if count <= len(entries) and (count == 0 or entries[count - 1].get('id') == self.entry_ids[-1]):
+            new_entries = entries[count:]
+            for entry in new_entries:
+                self.add(entry, persist=False)
+            self._log(list(enumerate(new_entries, count)))
+        else:
+            self._reset()
+            for entry in entries:
+                self.add(entry, persist=False)
+            self.save()
+        return self
+
+    def _log(self, records):
+        """Append indexed entries to the log, compacting once it is long"""
+        if not self.path or not records:
+            return
+        if self._logged + len(records) >= COMPACT_AFTER:
+            self.save()
+            return
+        with file_lock(self.path):
+            with open(self.log_path, 'a') as f:
+                f.write(''.join(json.dumps({'n': doc, 'entry': entry}) + '\n' for doc, entry in records))
+        self._logged += len(records)
+
+    def _load_snapshot(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        if snapshot.get('format') != INDEX_FORMAT:
+            raise ValueError(f"Search index format {snapshot.get('format')}, expected {INDEX_FORMAT}")
+        postings = {word.encode('utf-8'): tuple(array('I', buffer) for buffer in buffers)
+                    for word, buffers in snapshot['postings'].items()}
+        entry_ids = snapshot['entry_ids']
+        days = array('i', snapshot['days'])
+        moods = array('b', snapshot['moods'])
+        lengths = array('I', snapshot['lengths'])
+        if not len(entry_ids) == len(days) == len(moods) == len(lengths):
+            raise ValueError("Search index columns differ in length")
+        self.postings, self.entry_ids = postings, entry_ids
+        self.days, self.moods, self.lengths = days, moods, lengths
+        self.total_length = snapshot['total_length']
+
+    def save(self):
+        """Write a full snapshot and empty the log"""
+        if not self.path:
+            return
+        snapshot = {
+            'format': INDEX_FORMAT,
+            'postings': {word.decode('utf-8'): [buffer.tolist() for buffer in buffers]
+                         for word, buffers in self.postings.items()},
+            'entry_ids': self.entry_ids,
+            'days': self.days.tolist(),
+            'moods': self.moods.tolist(),
+            'lengths': self.lengths.tolist(),
+            'total_length': self.total_length
+        }
+        document = json.dumps(snapshot, separators=(',', ':')).encode('utf-8')
+        with file_lock(self.path):
+            atomic_write(self.path, lambda f: f.write(gzip.compress(document, compresslevel=6)), mode='wb')
+            # The snapshot covers everything logged so far
+            open(self.log_path, 'w').close()
+        self._logged = 0
+
+    def clear(self):
+        """Drop the index and its files"""
+        self._reset()
+        if self.path:
+            for path in (self.path, self.log_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _positions(self, word, doc):
+        docs, offsets, flat = self.postings[word]
+        i = int(np.searchsorted(_as_numpy(docs), doc))
+        end = offsets[i + 1] if i + 1 < len(offsets) else len(flat)
+        return flat[offsets[i]:end]
+
+    def _phrase_docs(self, phrase, candidates):
+        """Candidate documents containing the words of ``phrase`` in sequence"""
+        if any(word not in self.postings for word in phrase):
+            return np.empty(0, dtype=np.int64)
+        for word in phrase:
+            candidates = np.intersect1d(candidates, _as_numpy(self.postings[word][0]), assume_unique=True)
+        matched = []
+        for doc in candidates:
+            starts = set(self._positions(phrase[0], doc))
+            for shift, word in enumerate(phrase[1:], 1):
+                starts &= {position - shift for position in self._positions(word, doc)}
+                if not starts:
+                    break
+            if starts:
+                matched.append(doc)
+        return np.array(matched, dtype=np.int64)
+
+    def search(self, query, limit=20, start=None, end=None, min_mood=None, max_mood=None):
+        """Return up to ``limit`` matches, best first, as id/date/mood/score dicts.
+
+        Words are ranked with BM25; quoted phrases must appear verbatim.
+        ``start``/``end`` are inclusive ISO dates and the mood bounds are
+        inclusive too.
+        """
+        phrases = [words(phrase) for phrase in _PHRASE.findall(query)]
+        terms = set(words(_PHRASE.sub(' ', query))).union(*phrases)
+        count = len(self)
+        if not count or not terms:
+            return []
+
+        lengths = _as_numpy(self.lengths)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(self.total_length / count, 1))
+        scores = np.zeros(count)
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            docs, offsets, flat = (_as_numpy(buffer) for buffer in postings)
+            frequency = np.diff(offsets, append=len(flat)).astype(np.float64)
+            idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * frequency * (BM25_K1 + 1) / (frequency + norm[docs])
+
+        mask = scores > 0
+        if start or end:
+            days = _as_numpy(self.days)
+            if start:
+                mask &= days >= date.fromisoformat(start).toordinal()
+            if end:
+                mask &= days <= date.fromisoformat(end).toordinal()
+        if min_mood is not None or max_mood is not None:
+            moods = _as_numpy(self.moods)
+            if min_mood is not None:
+                mask &= moods >= min_mood
+            if max_mood is not None:
+                mask &= moods <= max_mood
+        hits = np.flatnonzero(mask)
+        for phrase in phrases:
+            if len(hits):
+                hits = self._phrase_docs(phrase, hits)
+
+        if len(hits) > limit:
+            # Keep everything above the limit-th best score, then the newest ties
+            top = scores[hits]
+            cutoff = np.partition(top, len(top) - limit)[len(top) - limit]
+            better = hits[top > cutoff]
+            hits = np.concatenate([better, hits[top == cutoff][::-1][:limit - len(better)]])
+        # Best score first, newer entries first among equals
+        hits = sorted(hits, key=lambda doc: (-scores[doc], -doc))
+        return [{'id': self.entry_ids[doc],
+                 'date': date.fromordinal(self.days[doc]).isoformat(),
+                 'mood': self.moods[doc],
+                 'score': float(scores[doc])} for doc in hits]
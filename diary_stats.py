@@ -0,0 +1,93 @@
+"""
+Incrementally maintained diary statistics.
+
+The sidebar's Quick Stats used to sort and parse every entry on each rerun.
+The aggregates here are updated in O(1) as entries are saved, persisted with
+the rest of the data, and can be rebuilt from scratch to check consistency.
+"""
+
+from datetime import date, timedelta
+
+# Average mood covers the most recent mood records
+RECENT_MOOD_WINDOW = 7
+
+
+def empty_aggregates():
+    """Return aggregates for an empty diary"""
+    return {
+        'total_entries': 0,
+        'last_entry_date': None,
+        'current_streak': 0,
+        'longest_streak': 0,
+        'recent_moods': [],
+        'recent_mood_sum': 0
+    }
+
+
+def update_aggregates(aggregates, entry=None, mood_entry=None):
+    """Return ``aggregates`` with one new entry and/or mood record folded in.
+
+    The input is left untouched, since it may be shared with a load cache.
+    """
+    aggregates = dict(aggregates, recent_moods=list(aggregates['recent_moods']))
+    if entry is not None:
+        aggregates['total_entries'] += 1
+        entry_date = date.fromisoformat(entry['date'])
+        last = aggregates['last_entry_date']
+        last = date.fromisoformat(last) if last else None
+        if last is None or entry_date > last + timedelta(days=1):
+            aggregates['current_streak'] = 1
+        elif entry_date == last + timedelta(days=1):
+            aggregates['current_streak'] += 1
+        # Same-day or back-dated entries leave the streak unchanged
+        if last is None or entry_date > last:
+            aggregates['last_entry_date'] = entry_date.isoformat()
+        aggregates['longest_streak'] = max(aggregates['longest_streak'], aggregates['current_streak'])
+
+    if mood_entry is not None:
+        recent = aggregates['recent_moods']
+        recent.append(mood_entry['mood'])
+        aggregates['recent_mood_sum'] += mood_entry['mood']
+        if len(recent) > RECENT_MOOD_WINDOW:
+            aggregates['recent_mood_sum'] -= recent.pop(0)
+    return aggregates
+
+
+def rebuild_aggregates(entries, mood_history):
+    """Recompute aggregates from the full history"""
+    aggregates = empty_aggregates()
+    aggregates['total_entries'] = len(entries)
+
+    streak = 0
+    previous = None
+    for entry_date in sorted({date.fromisoformat(entry['date']) for entry in entries}):
+        streak = streak + 1 if previous and entry_date == previous + timedelta(days=1) else 1
+        aggregates['longest_streak'] = max(aggregates['longest_streak'], streak)
+        previous = entry_date
+    if previous:
+        aggregates['last_entry_date'] = previous.isoformat()
+        aggregates['current_streak'] = streak
+
+    recent = [mood_entry['mood'] for mood_entry in mood_history[-RECENT_MOOD_WINDOW:]]
+    aggregates['recent_moods'] = recent
+    aggregates['recent_mood_sum'] = sum(recent)
+    return aggregates
+
+
+def aggregates_consistent(aggregates, entries, mood_history):
+    """Check stored aggregates against a rebuild from scratch"""
+    return aggregates == rebuild_aggregates(entries, mood_history)
+
+
+def current_streak(aggregates, today=None):
+    """Consecutive writing days ending today (0 if nothing was written today)"""
+    today = today or date.today()
+    if aggregates['last_entry_date'] != today.isoformat():
+        return 0
+    return aggregates['current_streak']
+
+
+def average_mood(aggregates):
+    """Average of the most recent mood records"""
+    recent = aggregates['recent_moods']
+    return aggregates['recent_mood_sum'] / len(recent) if recent else 0
@@ -0,0 +1,1030 @@
+"""
+Storage backends for the AI Student Diary.
+
+The app keeps its working copy of the diary in ``st.session_state`` and hands
+the collections to a store for persistence. ``JsonStore`` is the original
+single-file format; ``JournalStore`` appends one record per mutation so saving
+an entry no longer rewrites the whole history; ``SqliteStore`` keeps each
+collection in an indexed table so pages can query only what they render.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from diary_compress import ContentCodec, PackedEntry
+from diary_index import ID_COLLECTIONS, EntryOrder, merge_next_ids, reserve_ids, stored_next_ids
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+COLLECTIONS = ('entries', 'events', 'mood_history', 'insights')
+
+DEFAULT_JSON_PATH = 'diary_data.json'
+DEFAULT_JOURNAL_PATH = 'diary_data.journal'
+DEFAULT_SQLITE_PATH = 'diary_data.db'
+
+
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+
+def _lock_for(path):
+    """Return the process-wide lock guarding a data file"""
+    with _path_locks_guard:
+        if path not in _path_locks:
+            _path_locks[path] = threading.RLock()
+        return _path_locks[path]
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on ``path`` across processes and threads"""
+    lock = _lock_for(path)
+    with lock, open(path + '.lock', 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif msvcrt:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write(path, write, mode='w'):
+    """Write a file through ``write(f)`` and swap it in with a rename.
+
+    Readers see either the old or the new file, never a truncated one.
+    """
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def empty_data():
+    """Return an empty diary data dictionary"""
+    return {name: [] for name in COLLECTIONS}
+
+
+def copy_data(data):
+    """Copy collection lists and dictionaries so callers can't mutate shared cached state"""
+    return {name: (list(value) if isinstance(value, list) else
+                   dict(value) if isinstance(value, dict) else value)
+            for name, value in data.items()}
+
+
+def file_signature(*paths):
+    """Return (mtime, size, inode) for each existing path, None if none exist"""
+    signature = []
+    for path in paths:
+        if not path:
+            continue
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        signature.append((path, stat.st_mtime_ns, stat.st_size, stat.st_ino))
+    return tuple(signature) or None
+
+
+# Users whose parsed data stays cached; with sharding that's one file per user
+CACHED_SHARDS = 32
+
+
+class ShardCache:
+    """Bounded LRU of per-file state (parsed data, replayed journals, codecs).
+
+    A long-running server sees many users; only the most recently used
+    ``maxsize`` files keep their state, the rest are parsed again on demand.
+    """
+
+    def __init__(self, maxsize=CACHED_SHARDS):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, path, default=None):
+        with self._lock:
+            if path not in self._items:
+                return default
+            self._items.move_to_end(path)
+            return self._items[path]
+
+    def __setitem__(self, path, value):
+        with self._lock:
+            self._items[path] = value
+            self._items.move_to_end(path)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def pop(self, path, default=None):
+        with self._lock:
+            return self._items.pop(path, default)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# Parsed files shared across reruns and sessions: path -> (signature, data)
+_load_cache = ShardCache()
+_load_cache_lock = threading.Lock()
+cache_stats = {'hits': 0, 'misses': 0}
+
+
+def cached_load(path, signature, parse):
+    """Parse ``path`` with ``parse`` unless its signature is unchanged"""
+    with _load_cache_lock:
+        cached = _load_cache.get(path)
+        if cached and cached[0] == signature:
+            cache_stats['hits'] += 1
+            return copy_data(cached[1])
+        cache_stats['misses'] += 1
+    data = parse(path)
+    with _load_cache_lock:
+        _load_cache[path] = (signature, data)
+    return copy_data(data)
+
+
+def remember_load(path, signature, data):
+    """Record data just written to ``path`` so the next load is a cache hit"""
+    with _load_cache_lock:
+        _load_cache[path] = (signature, copy_data(data))
+
+
+def refresh_load(path, signature, new_signature, apply):
+    """Bring the cached parse of ``path`` up to date with a write.
+
+    ``apply(data)`` repeats the write on a copy of the parse if it was
+    current at ``signature``; otherwise the stale parse is dropped.
+    """
+    with _load_cache_lock:
+        cached = _load_cache.pop(path, None)
+        if cached and cached[0] == signature:
+            data = copy_data(cached[1])
+            apply(data)
+            _load_cache[path] = (new_signature, data)
+
+
+def merge_changes(data, changes):
+    """Add (collection, record) pairs to a data dictionary; other keys are replaced"""
+    for collection, record in changes:
+        if isinstance(data.get(collection), list):
+            data[collection].append(record)
+        else:
+            data[collection] = record
+
+
+def forget_load(path):
+    with _load_cache_lock:
+        _load_cache.pop(path, None)
+
+
+def get_cache_stats():
+    """Return load cache hit/miss counters and how many files are cached"""
+    return dict(cache_stats, cached_files=len(_load_cache), replayed_journals=len(_replay_cache))
+
+
+def clear_load_caches():
+    """Forget every cached parse, so the next load reads from disk"""
+    with _load_cache_lock:
+        _load_cache.clear()
+    _replay_cache.clear()
+    _content_codecs.clear()
+
+
+# Entry fields the entry browser lists without loading the text
+ENTRY_SUMMARY_FIELDS = ('id', 'date', 'mood', 'topics', 'word_count')
+
+
+def entry_summary(entry):
+    return {field: entry.get(field) for field in ENTRY_SUMMARY_FIELDS}
+
+
+class DiaryStore:
+    """Base class for diary storage backends"""
+
+    # Whether append writes only the new records (rather than the whole diary)
+    appends_incrementally = False
+
+    def __init__(self):
+        self.data = None
+        # Replaced by the app with the one kept in session state, so reruns share it
+        self.entry_order = EntryOrder()
+        # Running total of bytes this store has written, for metrics
+        self.bytes_written = 0
+
+    def load(self):
+        """Load all collections, or return None when nothing is stored yet"""
+        raise NotImplementedError
+
+    def version(self):
+        """Return a token that changes whenever the stored data changes"""
+        raise NotImplementedError
+
+    def save(self, data):
+        """Persist the full data dictionary"""
+        raise NotImplementedError
+
+    def append(self, changes, data):
+        """Persist new records given as (collection, record) pairs.
+
+        New records whose ids another session has stored meanwhile are
+        renumbered in place (see ``reserve_ids``); returns whether any were.
+        Backends without incremental writes fall back to a full save.
+        """
+        self.save(data)
+        return False
+
+    def update(self, collection, records, data):
+        """Persist changed records of a collection, matched by id.
+
+        Backends without incremental writes fall back to a full save.
+        """
+        self.save(data)
+
+    def tail(self, collection, n):
+        """Return the last ``n`` records of a collection"""
+        if self.data is None:
+            return []
+        return self.data.get(collection, [])[-n:]
+
+    def recent_entries(self, n):
+        """Return the newest ``n`` diary entries"""
+        return self.tail('entries', n)
+
+    def entries_page(self, page, page_size=10, start=None, end=None):
+        """Return (entry summaries, total) for one page of entries, newest first.
+
+        Summaries hold ``ENTRY_SUMMARY_FIELDS`` only; ``start``/``end`` are
+        optional inclusive ISO dates. The in-memory data is paged through
+        ``entry_order``, which only orders entries added since the last call.
+        """
+        entries = self.data.get('entries', []) if self.data else []
+        selected, total = self.entry_order.sync(entries).page(page, page_size, start, end)
+        return [entry_summary(entries[i]) for i in selected], total
+
+    def get_entry_content(self, entry_id):
+        """Return the full text of one entry, or None"""
+        for entry in reversed(self.data.get('entries', []) if self.data else []):
+            if entry.get('id') == entry_id:
+                return entry.get('content', '')
+        return None
+
+    def compact(self):
+        """Rewrite stored data without superseded records"""
+        data = self.load()
+        if data is not None:
+            self.save(data)
+
+    def clear(self):
+        """Remove all stored data"""
+        raise NotImplementedError
+
+
+# Content codecs of compressed JSON files, shared like the load cache: path -> codec
+_content_codecs = ShardCache()
+
+
+class JsonStore(DiaryStore):
+    """Original storage format: one pretty-printed JSON document.
+
+    With ``compress`` entry bodies are stored as ``content_z``, deflated
+    against a dictionary trained on the diary's own entries (kept in the
+    document as ``content_dictionary``); every other field stays plain JSON.
+    Compressed files load whether or not ``compress`` is set, with each body
+    decompressed only when it is first read.
+    """
+
+    def __init__(self, path=DEFAULT_JSON_PATH, compress=False):
+        super().__init__()
+        self.path = path
+        self.compress = compress
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        self.data = cached_load(self.path, self.version(), self._parse)
+        return self.data
+
+    def _parse(self, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        dictionary = data.pop('content_dictionary', None)
+        if dictionary:
+            codec = _content_codecs.get(path)
+            if codec is None or codec.dictionary_id != dictionary.get('id'):
+                codec = _content_codecs[path] = ContentCodec.from_json(dictionary)
+            data['entries'] = [codec.unpack_entry(entry) for entry in data.get('entries', [])]
+        for name in COLLECTIONS:
+            data.setdefault(name, [])
+        return data
+
+    def version(self):
+        return file_signature(self.path)
+
+    def save(self, data):
+        with file_lock(self.path):
+            if 'next_ids' in data and os.path.exists(self.path):
+                # Never hand out ids again that another session already used
+                merge_next_ids(data['next_ids'], stored_next_ids(cached_load(self.path, self.version(), self._parse)))
+            self._write(data)
+        self.data = data
+
+    def append(self, changes, data):
+        """Merge new records into the latest file contents under a lock.
+
+        Re-reading inside the lock means records saved meanwhile by other
+        sessions are kept instead of being overwritten.
+        """
+        if not changes:
+            return False
+        with file_lock(self.path):
+            if not os.path.exists(self.path):
+                self._write(data)
+                self.data = data
+                return False
+            merged = cached_load(self.path, self.version(), self._parse)
+            changes, renumbered = reserve_ids(changes, data.setdefault('next_ids', {}), stored_next_ids(merged))
+            merge_changes(merged, changes)
+            self._write(merged)
+        self.data = merged
+        return renumbered
+
+    def update(self, collection, records, data):
+        """Replace records by id in the latest file contents under a lock"""
+        if not records:
+            return
+        with file_lock(self.path):
+            if not os.path.exists(self.path):
+                self._write(data)
+                self.data = data
+                return
+            merged = cached_load(self.path, self.version(), self._parse)
+            _replace_records(merged.setdefault(collection, []), records)
+            self._write(merged)
+        self.data = merged
+
+    def _write(self, data):
+        if self.compress:
+            # Compressed documents skip the indentation too; they aren't read by eye
+            document = self._compressed(data)
+            atomic_write(self.path, lambda f: json.dump(document, f, separators=(',', ':')))
+            # The cached entries keep their compressed form, so later saves needn't redo it
+            codec = _content_codecs.get(self.path)
+            data = dict(data, entries=[
+                entry if isinstance(entry, PackedEntry) else codec.unpack_entry(stored, entry.get('content'))
+                for entry, stored in zip(data.get('entries') or [], document['entries'])])
+        else:
+            atomic_write(self.path, lambda f: json.dump(data, f, indent=2))
+        signature = self.version()
+        self.bytes_written += signature[0][2]
+        remember_load(self.path, signature, data)
+
+    def _compressed(self, data):
+        """Storage document with entry bodies compressed"""
+        entries = data.get('entries') or []
+        codec = _content_codecs.get(self.path)
+        if codec is None and entries and isinstance(entries[0], PackedEntry):
+            # Evicted from the cache, but loaded entries still carry it
+            codec = _content_codecs[self.path] = entries[0].codec
+        if codec is None or codec.needs_retraining(len(entries)):
+            codec = _content_codecs[self.path] = ContentCodec.train(entries)
+        document = dict(data)
+        document['entries'] = [codec.pack_entry(entry) for entry in entries]
+        document['content_dictionary'] = codec.to_json()
+        return document
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        forget_load(self.path)
+        _content_codecs.pop(self.path, None)
+        self.data = None
+
+
+# Journal index records: byte offset of the journal line + collection code
+_INDEX_RECORD = struct.Struct('<QB')
+_COLLECTION_CODES = {name: code for code, name in enumerate(COLLECTIONS)}
+
+# Replayed journal state shared across reruns: path -> (inode, offset, data)
+_replay_cache = ShardCache()
+
+
+def _replace_records(records, updated):
+    """Replace the records with the ids of ``updated`` in place.
+
+    Updates usually touch recent records, so the list is searched from the end.
+    """
+    pending = {record.get('id'): record for record in updated}
+    for i in range(len(records) - 1, -1, -1):
+        if not pending:
+            break
+        record_id = records[i].get('id')
+        if record_id in pending:
+            records[i] = pending.pop(record_id)
+
+
+def _apply_record(data, record):
+    """Apply one journal record to an in-memory data dictionary"""
+    op = record.get('op')
+    collection = record.get('c')
+    if op == 'add':
+        data.setdefault(collection, []).append(record['r'])
+    elif op == 'put':
+        data[collection] = record['r']
+    elif op == 'upd':
+        _replace_records(data.setdefault(collection, []), [record['r']])
+
+
+class JournalStore(DiaryStore):
+    """Append-only journal: one JSON line per mutation plus an offset index.
+
+    ``append`` writes only the new records, so saving is O(1) in the size of
+    the history. The ``.idx`` sidecar stores fixed-size (offset, collection)
+    records, which lets ``tail`` read the newest records of a collection
+    without parsing the journal. The journal is written first and is the
+    source of truth: an index that doesn't end where the journal does (lost
+    or torn in a crash) is rebuilt from it. ``compact`` rewrites the journal
+    from the replayed state and can run on a background thread.
+    """
+
+    compact_after = 1000
+    appends_incrementally = True
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH, legacy_path=DEFAULT_JSON_PATH):
+        super().__init__()
+        self.path = path
+        self.index_path = path + '.idx'
+        self.legacy_path = legacy_path
+        self.lock = _lock_for(path)
+        self._compaction_thread = None
+
+    def _write_lock(self):
+        return file_lock(self.path)
+
+    def load(self):
+        with self.lock:
+            if not os.path.exists(self.path):
+                if self.legacy_path and os.path.exists(self.legacy_path):
+                    # Migrate the old single-file format into a fresh journal
+                    data = JsonStore(self.legacy_path).load()
+                    self.save(data)
+                    return copy_data(data)
+                return None
+            self.data = copy_data(self._replay())
+            return self.data
+
+    def version(self):
+        return file_signature(self.path, self.legacy_path)
+
+    def _replay(self):
+        """Return the shared replayed state, parsing only newly appended lines"""
+        stat = os.stat(self.path)
+        # Rewrites swap in a new file, so the inode identifies the generation
+        cached = _replay_cache.get(self.path)
+        if cached and cached[0] == stat.st_ino and cached[1] <= stat.st_size:
+            offset, data = cached[1], cached[2]
+            if offset == stat.st_size:
+                cache_stats['hits'] += 1
+                return data
+        else:
+            offset, data = 0, empty_data()
+        cache_stats['misses'] += 1
+
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn final line from an interrupted write
+                    break
+                _apply_record(data, record)
+                offset += len(line)
+
+        _replay_cache[self.path] = (stat.st_ino, offset, data)
+        return data
+
+    def save(self, data):
+        with self._write_lock():
+            if 'next_ids' in data and os.path.exists(self.path):
+                merge_next_ids(data['next_ids'], stored_next_ids(self._replay()))
+            self._rewrite(data)
+        self.data = data
+
+    def append(self, changes, data):
+        if not changes:
+            return False
+        return self._append_records(changes, data)
+
+    def update(self, collection, records, data):
+        """Append ``upd`` records, which replace earlier records with the same id"""
+        if records:
+            self._append_records([(collection, record) for record in records], data, update=True)
+
+    def _append_records(self, changes, data, update=False):
+        """Append (collection, record) pairs as ``add``/``put`` journal records, or ``upd`` ones.
+
+        Returns whether new records were renumbered.
+        """
+        renumbered = False
+        with self._write_lock():
+            if not os.path.exists(self.path):
+                self._rewrite(data)
+                self.data = data
+                return renumbered
+            self._check_index()
+            if not update:
+                # The replayed state is current up to the last write, so only new lines are parsed
+                changes, renumbered = reserve_ids(changes, data.setdefault('next_ids', {}),
+                                                  stored_next_ids(self._replay()))
+
+            lines = []
+            codes = []
+            for collection, record in changes:
+                op = 'upd' if update else 'add' if isinstance(data.get(collection), list) else 'put'
+                lines.append(json.dumps({'op': op, 'c': collection, 'r': record}).encode() + b'\n')
+                codes.append(_COLLECTION_CODES.get(collection, 255))
+
+            with open(self.path, 'ab') as f:
+                offset = f.tell()
+                f.write(b''.join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+
+            index = bytearray()
+            for line, code in zip(lines, codes):
+                index += _INDEX_RECORD.pack(offset, code)
+                offset += len(line)
+            with open(self.index_path, 'ab') as f:
+                f.write(index)
+                f.flush()
+                os.fsync(f.fileno())
+            self.bytes_written += sum(map(len, lines)) + len(index)
+
+            record_count = os.path.getsize(self.index_path) // _INDEX_RECORD.size
+        self.data = data
+
+        live_count = sum(len(value) if isinstance(value, list) else 1 for value in data.values())
+        if record_count - live_count >= self.compact_after:
+            self.compact_in_background()
+        return renumbered
+
+    def tail(self, collection, n):
+        """Read the newest ``n`` records of a collection using the offset index"""
+        with self._write_lock():
+            if not os.path.exists(self.path):
+                return super().tail(collection, n)
+            self._check_index()
+
+            code = _COLLECTION_CODES[collection]
+            size = _INDEX_RECORD.size
+            records = []
+            # Read newest first, so an update is seen before the record it replaces
+            updated = {}
+            with open(self.index_path, 'rb') as index, open(self.path, 'rb') as journal:
+                position = os.path.getsize(self.index_path) // size
+                while position > 0 and len(records) < n:
+                    position -= 1
+                    index.seek(position * size)
+                    offset, record_code = _INDEX_RECORD.unpack(index.read(size))
+                    if record_code != code:
+                        continue
+                    journal.seek(offset)
+                    record = json.loads(journal.readline())
+                    if record.get('op') == 'add':
+                        records.append(updated.get(record['r'].get('id'), record['r']))
+                    elif record.get('op') == 'upd':
+                        updated.setdefault(record['r'].get('id'), record['r'])
+        records.reverse()
+        return records
+
+    def compact(self):
+        """Rewrite the journal as one record per live item"""
+        with self._write_lock():
+            if os.path.exists(self.path):
+                self._rewrite(self._replay())
+
+    def compact_in_background(self):
+        """Start compaction on a daemon thread unless one is already running"""
+        if self._compaction_thread and self._compaction_thread.is_alive():
+            return self._compaction_thread
+        self._compaction_thread = threading.Thread(target=self.compact, daemon=True)
+        self._compaction_thread.start()
+        return self._compaction_thread
+
+    def clear(self):
+        with self._write_lock():
+            for path in (self.path, self.index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            if self.legacy_path and os.path.exists(self.legacy_path):
+                os.remove(self.legacy_path)
+            _replay_cache.pop(self.path, None)
+        self.data = None
+
+    def _rewrite(self, data):
+        """Write a fresh journal holding ``data`` and swap it in atomically.
+
+        The old index is removed before the journal is replaced, so a crash
+        in between leaves a missing index (rebuilt on use), never an index
+        of the old journal paired with the new one.
+        """
+        tmp_path = self.path + '.tmp'
+        tmp_index_path = self.index_path + '.tmp'
+        offset = 0
+        with open(tmp_path, 'wb') as journal, open(tmp_index_path, 'wb') as index:
+            for collection, value in data.items():
+                code = _COLLECTION_CODES.get(collection, 255)
+                if isinstance(value, list):
+                    records = [{'op': 'add', 'c': collection, 'r': item} for item in value]
+                else:
+                    records = [{'op': 'put', 'c': collection, 'r': value}]
+                for record in records:
+                    line = json.dumps(record).encode() + b'\n'
+                    journal.write(line)
+                    index.write(_INDEX_RECORD.pack(offset, code))
+                    offset += len(line)
+            for f in (journal, index):
+                f.flush()
+                os.fsync(f.fileno())
+            self.bytes_written += offset + index.tell()
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+        os.replace(tmp_path, self.path)
+        os.replace(tmp_index_path, self.index_path)
+        _replay_cache.pop(self.path, None)
+
+    def _check_index(self):
+        """Rebuild the index unless it covers every complete line of the journal.
+
+        Appends reach the journal before the index, so the last index record
+        must point at the start of the journal's last complete line. Only
+        that line and anything after it are read.
+        """
+        size = _INDEX_RECORD.size
+        index_size = os.path.getsize(self.index_path) if os.path.exists(self.index_path) else -1
+        if index_size >= 0 and index_size % size == 0:
+            with open(self.path, 'rb') as journal:
+                complete = True
+                if index_size:
+                    with open(self.index_path, 'rb') as index:
+                        index.seek(index_size - size)
+                        offset, _ = _INDEX_RECORD.unpack(index.read(size))
+                    if offset:
+                        journal.seek(offset - 1)
+                        complete = journal.read(1) == b'\n'
+                    complete = complete and journal.readline().endswith(b'\n')
+                # A torn final line without its newline is skipped by replay too
+                if complete and b'\n' not in journal.read():
+                    return
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        """Recreate the offset index by scanning the journal"""
+        offset = 0
+        index = bytearray()
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                index += _INDEX_RECORD.pack(offset, _COLLECTION_CODES.get(record.get('c'), 255))
+                offset += len(line)
+        atomic_write(self.index_path, lambda f: f.write(index), mode='wb')
+
+
+class SqliteStore(DiaryStore):
+    """Embedded SQLite database with one table per collection.
+
+    Records are indexed by the columns the store's queries look up (entry and
+    event ``id``, entry ``date``); the full record is kept as JSON in ``data``
+    so new fields need no migration.
+    Until the database exists, queries fall back to the in-memory data.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS entries (
+            seq INTEGER PRIMARY KEY, id INTEGER, date TEXT, mood INTEGER, data TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS calendar_events (
+            seq INTEGER PRIMARY KEY, id INTEGER, date TEXT, title TEXT, data TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS mood_history (
+            seq INTEGER PRIMARY KEY, date TEXT, mood INTEGER, data TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS insights (
+            seq INTEGER PRIMARY KEY, data TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY, data TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS idx_entries_id ON entries (id);
+        CREATE INDEX IF NOT EXISTS idx_entries_date ON entries (date);
+        CREATE INDEX IF NOT EXISTS idx_events_id ON calendar_events (id);
+        -- No query reads these; older databases still have them
+        DROP INDEX IF EXISTS idx_entries_mood;
+        DROP INDEX IF EXISTS idx_events_date;
+        DROP INDEX IF EXISTS idx_mood_date;
+        DROP INDEX IF EXISTS idx_mood_mood;
+    """
+
+    appends_incrementally = True
+
+    # Collection name -> (table, indexed columns)
+    tables = {
+        'entries': ('entries', ('id', 'date', 'mood')),
+        'events': ('calendar_events', ('id', 'date', 'title')),
+        'mood_history': ('mood_history', ('date', 'mood')),
+        'insights': ('insights', ()),
+    }
+
+    def __init__(self, path=DEFAULT_SQLITE_PATH, legacy_path=DEFAULT_JSON_PATH):
+        super().__init__()
+        self.path = path
+        self.legacy_path = legacy_path
+        self._conn = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def is_empty(self):
+        """Whether nothing has been stored yet (no database, or one with no rows)"""
+        if not self.exists():
+            return True
+        conn = self.connect()
+        tables = [table for table, _ in self.tables.values()] + ['meta']
+        return not any(conn.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone() for table in tables)
+
+    def version(self):
+        # Committed transactions touch the database or its write-ahead log
+        return file_signature(self.path, self.path + '-wal', self.legacy_path)
+
+    def connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(self.schema)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def load(self):
+        if not self.exists():
+            if self.legacy_path and os.path.exists(self.legacy_path):
+                # Migrate the old single-file format into the database
+                data = JsonStore(self.legacy_path).load()
+                self.save(data)
+                return data
+            return None
+        self.data = cached_load(self.path, self.version(), self._read_all)
+        return self.data
+
+    def _read_all(self, path):
+        conn = self.connect()
+        data = {}
+        for collection, (table, _) in self.tables.items():
+            rows = conn.execute(f'SELECT data FROM {table} ORDER BY seq')
+            data[collection] = [json.loads(row[0]) for row in rows]
+        for key, value in conn.execute('SELECT key, data FROM meta'):
+            data[key] = json.loads(value)
+        return data
+
+    def save(self, data):
+        with file_lock(self.path):
+            self._save(data)
+
+    def _save(self, data):
+        conn = self.connect()
+        with conn:
+            if 'next_ids' in data:
+                merge_next_ids(data['next_ids'], self._stored_next_ids(conn))
+            for table, _ in self.tables.values():
+                conn.execute(f'DELETE FROM {table}')
+            conn.execute('DELETE FROM meta')
+            self._insert(conn, data.items())
+        remember_load(self.path, self.version(), data)
+        self.data = data
+
+    def append(self, changes, data):
+        if not changes:
+            return
+        with file_lock(self.path):
+            if self.is_empty():
+                # The first write stores everything the session holds, not just the new records
+                self._save(data)
+                return False
+            version = self.version()
+            conn = self.connect()
+            with conn:
+                changes, renumbered = reserve_ids(changes, data.setdefault('next_ids', {}),
+                                                  self._stored_next_ids(conn))
+                # Consecutive records of one collection go in as one executemany
+                items = []
+                for collection, record in changes:
+                    if collection not in self.tables:
+                        items.append((collection, record))
+                    elif items and items[-1][0] == collection:
+                        items[-1][1].append(record)
+                    else:
+                        items.append((collection, [record]))
+                self._insert(conn, items)
+            # The session's data may be stale, so the cached parse gets just the new records
+            refresh_load(self.path, version, self.version(), lambda cached: merge_changes(cached, changes))
+        self.data = data
+        return renumbered
+
+    def _stored_next_ids(self, conn):
+        """The stored id counters, never below the largest stored id"""
+        row = conn.execute("SELECT data FROM meta WHERE key = 'next_ids'").fetchone()
+        next_ids = json.loads(row[0]) if row else {}
+        for collection in ID_COLLECTIONS:
+            table, _ = self.tables[collection]
+            largest = conn.execute(f'SELECT MAX(id) FROM {table}').fetchone()[0]
+            next_ids[collection] = max(next_ids.get(collection, 1), (largest or 0) + 1)
+        return next_ids
+
+    def update(self, collection, records, data):
+        table, columns = self.tables[collection]
+        if 'id' not in columns or self.is_empty():
+            return super().update(collection, records, data)
+        if not records:
+            return
+        columns = tuple(column for column in columns if column != 'id') + ('data',)
+        rows = [tuple(record.get(column) for column in columns[:-1]) + (json.dumps(record), record.get('id'))
+                for record in records]
+        with file_lock(self.path):
+            version = self.version()
+            conn = self.connect()
+            with conn:
+                conn.executemany(
+                    f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?", rows)
+            refresh_load(self.path, version, self.version(),
+                         lambda cached: _replace_records(cached[collection], records))
+        self.bytes_written += sum(len(row[-2]) for row in rows)
+        self.data = data
+
+    def _insert(self, conn, items):
+        """Insert (collection, records) pairs; non-collection keys go to ``meta``"""
+        for collection, value in items:
+            if collection not in self.tables:
+                payload = json.dumps(value)
+                conn.execute('INSERT OR REPLACE INTO meta (key, data) VALUES (?, ?)',
+                             (collection, payload))
+                self.bytes_written += len(payload)
+                continue
+            table, columns = self.tables[collection]
+            placeholders = ', '.join('?' * (len(columns) + 1))
+            rows = [tuple(record.get(column) for column in columns) + (json.dumps(record),)
+                    for record in value]
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(columns + ('data',))}) VALUES ({placeholders})", rows)
+            self.bytes_written += sum(len(row[-1]) for row in rows)
+
+    def tail(self, collection, n):
+        if not self.exists():
+            return super().tail(collection, n)
+        table, _ = self.tables[collection]
+        rows = self.connect().execute(
+            f'SELECT data FROM {table} ORDER BY seq DESC LIMIT ?', (n,)).fetchall()
+        return [json.loads(row[0]) for row in reversed(rows)]
+
+    def entries_page(self, page, page_size=10, start=None, end=None):
+        if not self.exists():
+            return super().entries_page(page, page_size, start, end)
+        conn = self.connect()
+        # Without a date filter COUNT(*) scans the narrowest index instead of comparing dates
+        where, bounds = '', ()
+        if start or end:
+            where, bounds = 'WHERE date BETWEEN ? AND ?', (start or '0000-00-00', end or '9999-99-99')
+        total = conn.execute(f'SELECT COUNT(*) FROM entries {where}', bounds).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT id, date, mood, json_extract(data, '$.topics'), json_extract(data, '$.word_count') "
+            f'FROM entries {where} ORDER BY date DESC, seq DESC LIMIT ? OFFSET ?',
+            bounds + (page_size, page * page_size))
+        return [{'id': entry_id, 'date': entry_date, 'mood': mood,
+                 'topics': json.loads(topics) if topics else [], 'word_count': word_count}
+                for entry_id, entry_date, mood, topics, word_count in rows], total
+
+    def get_entry_content(self, entry_id):
+        if not self.exists():
+            return super().get_entry_content(entry_id)
+        row = self.connect().execute(
+            "SELECT json_extract(data, '$.content') FROM entries WHERE id = ? ORDER BY seq DESC LIMIT 1",
+            (entry_id,)).fetchone()
+        return row[0] if row else None
+
+    def compact(self):
+        """Reclaim space left by deleted rows"""
+        if self.exists():
+            conn = self.connect()
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            conn.execute('VACUUM')
+
+    def clear(self):
+        self.close()
+        forget_load(self.path)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+        if self.legacy_path and os.path.exists(self.legacy_path):
+            os.remove(self.legacy_path)
+        self.data = None
+
+
+STORAGE_BACKENDS = {
+    'json': JsonStore,
+    'journal': JournalStore,
+    'sqlite': SqliteStore,
+}
+
+
+def user_key(user_id):
+    """Normalize a user identity into a stable shard key.
+
+    Only case and surrounding whitespace are folded; every other character
+    is part of the identity, so "José", "Jos" and "李明" get separate shards.
+    """
+    return str(user_id).strip().casefold() or 'default'
+
+
+def shard_dir(root, user_id):
+    """Return the storage directory for one user.
+
+    Shards fan out over two levels of 256 directories keyed by a hash of the
+    user, e.g. ``users/3f/a2/3fa2c0...``, so no directory grows too large.
+    """
+    digest = hashlib.sha1(user_key(user_id).encode('utf-8')).hexdigest()
+    return os.path.join(root, 'users', digest[:2], digest[2:4], digest)
+
+
+def get_store(backend=None, user_id=None, data_dir=None):
+    """Create the storage backend selected by ``DIARY_STORAGE`` (default: json).
+
+    When ``DIARY_DATA_DIR`` is set, each user gets their own shard directory
+    under it; otherwise all data lives in the working directory.
+    """
+    backend = backend or os.environ.get('DIARY_STORAGE', 'json')
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    compress = os.environ.get('DIARY_COMPRESS', '') not in ('', '0')
+    data_dir = data_dir or os.environ.get('DIARY_DATA_DIR')
+    if not data_dir:
+        return JsonStore(compress=compress) if backend == 'json' else STORAGE_BACKENDS[backend]()
+
+    directory = shard_dir(data_dir, user_id or 'default')
+    os.makedirs(directory, exist_ok=True)
+    return shard_store(directory, backend, compress)
+
+
+def shard_store(directory, backend='json', compress=False):
+    """Create the store of a backend for one shard directory"""
+    json_path = os.path.join(directory, DEFAULT_JSON_PATH)
+    if backend == 'json':
+        return JsonStore(json_path, compress=compress)
+    if backend == 'journal':
+        return JournalStore(os.path.join(directory, DEFAULT_JOURNAL_PATH), legacy_path=json_path)
+    return STORAGE_BACKENDS[backend](os.path.join(directory, DEFAULT_SQLITE_PATH), legacy_path=json_path)
+
+
+def iter_shards(root):
+    """Yield every user shard directory under a ``DIARY_DATA_DIR``"""
+    users = os.path.join(root, 'users')
+    if not os.path.isdir(users):
+        return
+    for first in sorted(os.listdir(users)):
+        for second in sorted(os.listdir(os.path.join(users, first))):
+            parent = os.path.join(users, first, second)
+            for name in sorted(os.listdir(parent)):
+                if os.path.isdir(os.path.join(parent, name)):
+                    yield os.path.join(parent, name)